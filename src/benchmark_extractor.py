@@ -0,0 +1,110 @@
+import time
+import resource
+import multiprocessing as mp
+
+import numpy as np
+
+from gymnasium import Env, spaces
+
+from stable_baselines3 import DQN
+from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.logger import configure
+
+from feature_extractors import extractors, get_policy_kwargs
+
+
+class FrameEnv(Env):
+    """
+    Stand in environment with the same spaces as MetroidGymEnv, so the learner
+    can be benchmarked without a ROM
+    """
+    def __init__(self):
+        self.observation_space = spaces.Box(low=0, high=255, shape=(144, 160, 3), dtype=np.uint8)
+        self.action_space = spaces.Discrete(5)
+
+
+    def step(self, action):
+        return self.observation_space.sample(), 0.0, False, False, {}
+
+
+    def reset(self, seed=None, options=None):
+        return self.observation_space.sample(), {}
+
+
+def random_frames(n):
+    """
+    Creates channel first frames that only use the 4 Game Boy shades
+
+    :param n (int): number of frames
+
+    :return: (np.ndarray)
+    """
+    palette = np.array([255, 153, 85, 0], dtype=np.uint8)
+    shades = palette[np.random.randint(0, 4, size=(n, 1, 144, 160))]
+    return np.repeat(shades, 3, axis=1)
+
+
+def benchmark(name, buffer_size, batch_size, gradient_steps, results):
+    """
+    Times learner updates for one feature extractor. Ran in its own process
+    so the peak memory of each extractor is measured separately
+
+    :param name (str): key in feature_extractors.extractors
+    :param buffer_size (int): number of transitions in the replay buffer
+    :param batch_size (int): minibatch size of each update
+    :param gradient_steps (int): number of updates to time
+    :param results (mp.Queue): queue to put the results in
+    """
+    env = DummyVecEnv([FrameEnv])
+    model = DQN('CnnPolicy',
+                env,
+                buffer_size=buffer_size,
+                batch_size=batch_size,
+                learning_starts=0,
+                policy_kwargs=get_policy_kwargs(name),
+                device='cpu')
+    model.set_logger(configure(None, []))
+
+    # fill the replay buffer with frames, model's env is transposed to channel first
+    frames = random_frames(buffer_size + 1)
+    for i in range(buffer_size):
+        model.replay_buffer.add(frames[i][None], frames[i+1][None], np.array([0]), np.array([0.0]), np.array([False]), [{}])
+
+    # warm up
+    model.train(gradient_steps=5, batch_size=batch_size)
+
+    start = time.perf_counter()
+    model.train(gradient_steps=gradient_steps, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+
+    n_params = sum(p.numel() for p in model.policy.parameters())
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    results.put({
+        "features_extractor": name,
+        "updates_per_sec": gradient_steps / elapsed,
+        "parameters": n_params,
+        "peak_rss_mb": peak_rss
+    })
+
+
+if __name__ == '__main__':
+
+    # same batch size as train.py, smaller buffer to keep the benchmark quick
+    buffer_size = 2048
+    batch_size = 256
+    gradient_steps = 50
+
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+
+    for name in extractors:
+        p = ctx.Process(target=benchmark, args=(name, buffer_size, batch_size, gradient_steps, results))
+        p.start()
+        r = results.get()
+        p.join()
+
+        print(f"{r['features_extractor']:>16}: "
+              f"{r['updates_per_sec']:7.2f} updates/sec, "
+              f"{r['parameters']:>10,} parameters, "
+              f"{r['peak_rss_mb']:8.1f} MB peak rss")
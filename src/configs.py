@@ -4,45 +4,68 @@ import os
 basic = {
     "action_frequency": 5,
     "states": [
-            #    "../states/chkpt_1.state",
-            #    "../states/chkpt_2.state",
-            #    "../states/chkpt_3.state",
-            #    "../states/chkpt_4.state",
-            #    "../states/chkpt_5.state",
-            #    "../states/chkpt_6.state",
-            #    "../states/chkpt_7.state",
-            #    "../states/chkpt_8.state",
-            #    "../states/chkpt_9.state",
-                "../states/chkpt_10.state"
+                "../states/chkpt_1.state",
+                "../states/chkpt_2.state",
+                "../states/chkpt_3.state",
+                "../states/chkpt_4.state",
+                "../states/chkpt_5.state",
+                "../states/chkpt_6.state",
+                "../states/chkpt_7.state",
+                "../states/chkpt_8.state",
+                "../states/chkpt_9.state",
+                "../states/chkpt_10.state",
+                "../states/chkpt_11.state"
                ],
     "rom_path": "../ROMs/Metroid2.gb",
     "seed": None,
     "max_steps": 32768,
     "window": 'headless',
     "n_envs": os.cpu_count(),
-    "save_rewards": True
+    "save_rewards": True,
+    "features_extractor": "gameboy",
+    # pick start states by learning progress instead of once at random
+    "curriculum": True,
+    # overrides the env's default reward weights, None to keep them all
+    "reward_weights": None,
+    # 'pixels' for the full frame, 'hybrid' for the frame without the HUD and a vector of memory values
+    "observation": "pixels",
+    # directory to record every transition to for offline training, None to not record
+    "record_path": None,
+    # reward memory states that all envs have rarely seen
+    "novelty": False,
+    # keep the replay buffer in files (about 1.4 GB with the default buffer) and save everything needed to resume
+    "resumable": False
 }
 
 short = {
     "action_frequency": 5,
     "states": [
-            #    "../states/chkpt_1.state",
-            #    "../states/chkpt_2.state",
-            #    "../states/chkpt_3.state",
-            #    "../states/chkpt_4.state",
-            #    "../states/chkpt_5.state",
-            #    "../states/chkpt_6.state",
-            #    "../states/chkpt_7.state",
-            #    "../states/chkpt_8.state",
-            #    "../states/chkpt_9.state",
-                "../states/chkpt_10.state"
+                "../states/chkpt_1.state",
+                "../states/chkpt_2.state",
+                "../states/chkpt_3.state",
+                "../states/chkpt_4.state",
+                "../states/chkpt_5.state",
+                "../states/chkpt_6.state",
+                "../states/chkpt_7.state",
+                "../states/chkpt_8.state",
+                "../states/chkpt_9.state",
+                "../states/chkpt_10.state",
+                "../states/chkpt_11.state"
                ],
     "rom_path": "../ROMs/Metroid2.gb",
     "seed": None,
     "max_steps": 512,
     "window": 'headless',
     "n_envs": 10,
-    "save_rewards": True
+    "save_rewards": True,
+    "features_extractor": "gameboy",
+    # pick start states by learning progress instead of once at random
+    "curriculum": True,
+    "reward_weights": None,
+    "observation": "pixels",
+    "record_path": None,
+    "novelty": False,
+    "resumable": False
 }
 
 replay = {
@@ -64,5 +87,12 @@ replay = {
     "max_steps": 5000,
     "window": 'SDL2',
     "n_envs": 1,
-    "save_rewards": False
+    "save_rewards": False,
+    "features_extractor": "gameboy",
+    "curriculum": False,
+    "reward_weights": None,
+    "observation": "pixels",
+    "record_path": None,
+    "novelty": False,
+    "resumable": False
 }
@@ -0,0 +1,193 @@
+import copy
+from pathlib import Path
+
+import numpy as np
+
+from stable_baselines3.common.callbacks import BaseCallback
+
+from shared_arrays import SharedArray
+
+
+# fields tracked for every (worker, start state)
+ATTEMPTS = 0
+SUCCESSES = 1
+DEATHS = 2
+RETURNS = 3
+N_FIELDS = 4
+
+# moving averages of the success rate of every start state
+UPDATES = 0
+FAST_SUCCESS = 1
+SLOW_SUCCESS = 2
+N_PROGRESS_FIELDS = 3
+
+
+class Curriculum:
+    """
+    Picks start states in proportion to how fast the agent is learning them.
+    Learning progress of a state is the gap between a fast and a slow moving
+    average of its success rate, so states that are mastered or not improving
+    are picked less. Every worker writes only its own row of the shared stats.
+    The averages are shared by all workers and aren't locked, so an update
+    from two workers finishing the same state at once can be lost, which only
+    skips one outcome.
+    """
+    def __init__(self, states, n_workers, fast_rate=0.1, slow_rate=0.01, explore=0.1, min_attempts=3):
+        """
+        Constructor for Curriculum
+
+        :param states (list[str]): paths of the start states
+        :param n_workers (int): number of envs that will share the curriculum
+        :param fast_rate (float): update rate of the fast success average
+        :param slow_rate (float): update rate of the slow success average
+        :param explore (float): share of resets that pick a state uniformly
+        :param min_attempts (int): attempts a state needs before its progress is used
+        """
+        self.states = states
+        self.fast_rate = fast_rate
+        self.slow_rate = slow_rate
+        self.explore = explore
+        self.min_attempts = min_attempts
+
+        self.stats = SharedArray((n_workers, len(states), N_FIELDS), np.float64)
+        self.progress = SharedArray((len(states), N_PROGRESS_FIELDS), np.float64)
+
+        # set in self.worker()
+        self.rank = None
+
+
+    def worker(self, rank):
+        """
+        Gets the curriculum for a single env, which shares stats with the others
+
+        :param rank (int): index of the env
+
+        :return: (Curriculum)
+        """
+        curriculum = copy.copy(self)
+        curriculum.rank = rank
+        return curriculum
+
+
+    def record(self, state_index, success, died, episode_return):
+        """
+        Records the result of an episode
+
+        :param state_index (int): index of the start state of the episode
+        :param success (bool): if the next checkpoint was reached
+        :param died (bool): if Samus died during the episode
+        :param episode_return (float): sum of rewards of the episode
+        """
+        row = self.stats.array[self.rank, state_index]
+
+        row[ATTEMPTS] += 1
+        row[SUCCESSES] += success
+        row[DEATHS] += died
+        row[RETURNS] += episode_return
+
+        progress = self.progress.array[state_index]
+        progress[UPDATES] += 1
+        progress[FAST_SUCCESS] += self.fast_rate * (success - progress[FAST_SUCCESS])
+        progress[SLOW_SUCCESS] += self.slow_rate * (success - progress[SLOW_SUCCESS])
+
+
+    def learning_progress(self):
+        """
+        Gets the learning progress of every start state over all workers
+
+        :return: (np.ndarray)
+        """
+        progress = self.progress.array
+        updates = progress[:, UPDATES]
+
+        # averages start at 0, dividing by the weight they have seen removes the
+        # bias, so a state that always succeeds has no progress from the start
+        fast = progress[:, FAST_SUCCESS] / np.maximum(1 - (1 - self.fast_rate) ** updates, 1e-12)
+        slow = progress[:, SLOW_SUCCESS] / np.maximum(1 - (1 - self.slow_rate) ** updates, 1e-12)
+
+        return np.abs(fast - slow)
+
+
+    def probabilities(self):
+        """
+        Gets the chance of each start state being picked
+
+        :return: (np.ndarray)
+        """
+        n_states = len(self.states)
+        attempts = self.stats.array[:, :, ATTEMPTS].sum(axis=0)
+
+        # try every state a few times before trusting its progress
+        untried = attempts < self.min_attempts
+        if untried.any():
+            return untried / untried.sum()
+
+        progress = self.learning_progress()
+        if progress.sum() == 0:
+            return np.full(n_states, 1 / n_states)
+
+        return (1 - self.explore) * progress / progress.sum() + self.explore / n_states
+
+
+    def sample(self):
+        """
+        Picks the start state of the next episode
+
+        :return: (int) index of the start state
+        """
+        return int(np.random.choice(len(self.states), p=self.probabilities()))
+
+
+    def summary(self):
+        """
+        Gets the stats of every start state summed over all workers
+
+        :return: (dict)
+        """
+        stats = self.stats.array.sum(axis=0)
+        attempts = np.maximum(stats[:, ATTEMPTS], 1)
+
+        return {
+            "state": self.states,
+            "attempts": stats[:, ATTEMPTS],
+            "success_rate": stats[:, SUCCESSES] / attempts,
+            "death_rate": stats[:, DEATHS] / attempts,
+            "mean_return": stats[:, RETURNS] / attempts,
+            "learning_progress": self.learning_progress(),
+            "probability": self.probabilities()
+        }
+
+
+    def close(self):
+        """
+        Frees the shared stats, only call from the process that created the curriculum
+        """
+        self.stats.close()
+        self.progress.close()
+
+
+class CurriculumCallback(BaseCallback):
+    """
+    Logs the curriculum stats of every start state to tensorboard
+    """
+    def __init__(self, curriculum, verbose=0):
+        """
+        Constructor for CurriculumCallback
+
+        :param curriculum (Curriculum): curriculum shared by the envs
+        :param verbose (int): verbosity level
+        """
+        super().__init__(verbose)
+        self.curriculum = curriculum
+
+
+    def _on_step(self):
+        return True
+
+
+    def _on_rollout_end(self):
+        summary = self.curriculum.summary()
+        for i, state in enumerate(summary["state"]):
+            name = Path(state).stem
+            self.logger.record(f"curriculum/{name}_probability", summary["probability"][i])
+            self.logger.record(f"curriculum/{name}_success_rate", summary["success_rate"][i])
@@ -0,0 +1,160 @@
+import torch
+from torch import nn
+import torch.nn.functional as F
+
+from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
+
+
+class GameBoyCNN(BaseFeaturesExtractor):
+    """
+    Small CNN sized for the 4 shade Game Boy screen instead of Atari frames.
+    Only one channel of the frame is used since the game is grayscale, and a
+    strided stem shrinks the frame before any wide convolutions are done.
+    """
+    def __init__(self, observation_space, features_dim=256, one_hot_palette=False):
+        """
+        Constructor for GameBoyCNN
+
+        :param observation_space (spaces.Box): channel first image space
+        :param features_dim (int): number of features output by the extractor
+        :param one_hot_palette (bool): split the 4 shades into their own channels
+        """
+        super().__init__(observation_space, features_dim)
+
+        self.one_hot_palette = one_hot_palette
+        n_input_channels = 4 if one_hot_palette else 1
+
+        self.cnn = nn.Sequential(
+            # stem: one 4x4 tile quarter per output pixel
+            nn.Conv2d(n_input_channels, 16, kernel_size=4, stride=4),
+            nn.ReLU(),
+            nn.Conv2d(16, 32, kernel_size=3, stride=2),
+            nn.ReLU(),
+            nn.Conv2d(32, 32, kernel_size=3, stride=2),
+            nn.ReLU(),
+            nn.Flatten()
+        )
+
+        # compute shape by doing one forward pass
+        with torch.no_grad():
+            sample = torch.as_tensor(observation_space.sample()[None]).float() / 255.0
+            n_flatten = self.cnn(self.preprocess(sample)).shape[1]
+
+        self.linear = nn.Sequential(nn.Linear(n_flatten, features_dim), nn.ReLU())
+
+
+    def forward(self, observations):
+        """
+        Extracts the features from a batch of normalized frames
+
+        :param observations (torch.Tensor): (batch, channels, height, width)
+
+        :return: (torch.Tensor)
+        """
+        return self.linear(self.cnn(self.preprocess(observations)))
+
+
+    def preprocess(self, observations):
+        """
+        Keeps a single channel of the frame, and optionally one hot encodes the shades
+
+        :param observations (torch.Tensor): (batch, channels, height, width)
+
+        :return: (torch.Tensor)
+        """
+        # game is grayscale so only the first channel is needed
+        gray = observations[:, :1]
+
+        if not self.one_hot_palette:
+            return gray
+
+        # the 4 palette shades are spread out over [0, 1] after normalization
+        shades = torch.round(gray.squeeze(1) * 3).long().clamp(0, 3)
+        return F.one_hot(shades, 4).permute(0, 3, 1, 2).float()
+
+
+class GameBoyCombinedExtractor(BaseFeaturesExtractor):
+    """
+    Extractor for the hybrid observation, the playfield goes through a GameBoyCNN
+    and the memory values go through a small linear layer
+    """
+    def __init__(self, observation_space, cnn_output_dim=256, ram_output_dim=64, one_hot_palette=False):
+        """
+        Constructor for GameBoyCombinedExtractor
+
+        :param observation_space (spaces.Dict): 'screen' and 'ram' spaces
+        :param cnn_output_dim (int): number of features output by the CNN
+        :param ram_output_dim (int): number of features output for the memory values
+        :param one_hot_palette (bool): split the 4 shades into their own channels
+        """
+        super().__init__(observation_space, features_dim=cnn_output_dim + ram_output_dim)
+
+        self.cnn = GameBoyCNN(observation_space['screen'], cnn_output_dim, one_hot_palette)
+        self.ram = nn.Sequential(nn.Linear(observation_space['ram'].shape[0], ram_output_dim), nn.ReLU())
+
+
+    def forward(self, observations):
+        """
+        Extracts the features from a batch of hybrid observations
+
+        :param observations (dict): batch of 'screen' and 'ram' tensors
+
+        :return: (torch.Tensor)
+        """
+        return torch.cat([self.cnn(observations['screen']), self.ram(observations['ram'])], dim=1)
+
+
+# name in configs.py: policy_kwargs passed to the model for each observation type
+extractors = {
+    # stable baselines default NatureCNN, or CombinedExtractor for hybrid observations
+    "nature": {
+        "pixels": {},
+        "hybrid": {}
+    },
+    "gameboy": {
+        "pixels": {
+            "features_extractor_class": GameBoyCNN,
+            "features_extractor_kwargs": {"features_dim": 256}
+        },
+        "hybrid": {
+            "features_extractor_class": GameBoyCombinedExtractor,
+            "features_extractor_kwargs": {"cnn_output_dim": 256}
+        }
+    },
+    "gameboy_palette": {
+        "pixels": {
+            "features_extractor_class": GameBoyCNN,
+            "features_extractor_kwargs": {"features_dim": 256, "one_hot_palette": True}
+        },
+        "hybrid": {
+            "features_extractor_class": GameBoyCombinedExtractor,
+            "features_extractor_kwargs": {"cnn_output_dim": 256, "one_hot_palette": True}
+        }
+    }
+}
+
+
+def get_policy_kwargs(name, observation="pixels"):
+    """
+    Gets the policy kwargs for the feature extractor set in the config
+
+    :param name (str): key in extractors
+    :param observation (str): 'pixels' or 'hybrid'
+
+    :return: (dict)
+    """
+    if name not in extractors:
+        raise Exception(f"Unknown features_extractor '{name}'. Options are: {list(extractors)}")
+
+    return dict(extractors[name][observation])
+
+
+def get_policy(observation):
+    """
+    Gets the stable baselines policy that matches the observation type
+
+    :param observation (str): 'pixels' or 'hybrid'
+
+    :return: (str)
+    """
+    return 'MultiInputPolicy' if observation == 'hybrid' else 'CnnPolicy'
@@ -8,4 +8,14 @@ ENEMY_KILLED_SFX = 2
 PREV_SAMUS_X_PIXEL = 0xD027
 PREV_SAMUS_X_SCREEN = 0xD028
 PREV_SAMUS_Y_PIXEL = 0xD029
-PREV_SAMUS_Y_SCREEN = 0xD02A
\ No newline at end of file
+PREV_SAMUS_Y_SCREEN = 0xD02A
+MAX_ENERGY_TANKS = 0xD050
+MAX_MISSILES_LOW = 0xD081
+MAX_MISSILES_HIGH = 0xD082
+# one flag per object of the area (enemies and items): 0xFF not seen, 0x01 alive, other values killed or collected
+ENEMY_SPAWN_FLAGS = 0xC500
+N_ENEMY_SPAWN_FLAGS = 0x100
+# loaded enemies, byte 0 is the status (0xFF empty), 0x1D the spawn flag index and 0x1E-0x1F the enemy type
+ENEMY_SLOTS = 0xC600
+ENEMY_SLOT_SIZE = 0x20
+N_ENEMY_SLOTS = 16
@@ -2,6 +2,7 @@ from random import randint
 from uuid import uuid4
 from pathlib import Path
 import math
+import io
 
 import numpy as np
 import pandas as pd
@@ -13,17 +14,131 @@ from pyboy.utils import WindowEvent
 
 import memory_constants as mem
 import checkpoint_path as chk
+from transition_dataset import TransitionRecorder
+
+
+# the HUD is drawn over the bottom tile row of the screen
+PLAYFIELD_HEIGHT = 136
+
+# episode progress saved with the emulator state, so a resumed env continues the same episode
+SNAPSHOT_ATTRIBUTES = [
+    'initial_state',
+    'state_index',
+    'previous_frame',
+    'last_obs',
+    'held_actions',
+    'held_other_buttons',
+    'reached_target',
+    'max_dist',
+    'rewards',
+    'total_reward',
+    'previous_health',
+    'previous_missiles',
+    'previous_armor_upgrade',
+    'previous_beam_upgrade',
+    'previous_metroids_remaining',
+    'previous_sfx',
+    'previous_checkpoint',
+    'enemies_killed',
+    'explored_coordinates',
+    'novelty_total',
+    'deaths',
+    'dead',
+    'steps_taken',
+    'resets',
+    'episode_return',
+    'episode_start_deaths',
+    'checkpoints_passed'
+]
+
+# memory values given to the policy in the hybrid observation
+RAM_FEATURES = [
+    mem.CURRENT_HP,
+    mem.CURRENT_MISSILES,
+    mem.GLOBAL_METROIDS_REMAINING,
+    mem.CURRENT_BEAM_UPGRADE,
+    mem.CURRENT_ARMOR_UPGRADE,
+    mem.PREV_SAMUS_X_SCREEN,
+    mem.PREV_SAMUS_Y_SCREEN,
+    mem.PREV_SAMUS_X_PIXEL,
+    mem.PREV_SAMUS_Y_PIXEL
+]
+
+
+# buttons the model can press
+VALID_ACTIONS = [
+    # move samus
+    # WindowEvent.PRESS_ARROW_DOWN,
+    WindowEvent.PRESS_ARROW_LEFT,
+    WindowEvent.PRESS_ARROW_UP,
+    # WindowEvent.PRESS_ARROW_RIGHT,
+
+    # jump/ shoot
+    WindowEvent.PRESS_BUTTON_A,
+    WindowEvent.PRESS_BUTTON_B,
+
+    # toggle missiles
+    WindowEvent.PRESS_BUTTON_SELECT
+]
+
+RELEASE_ACTIONS = [
+    # WindowEvent.RELEASE_ARROW_DOWN,
+    WindowEvent.RELEASE_ARROW_LEFT,
+    WindowEvent.RELEASE_ARROW_UP,
+    # WindowEvent.RELEASE_ARROW_RIGHT,
+    WindowEvent.RELEASE_BUTTON_A,
+    WindowEvent.RELEASE_BUTTON_B,
+    WindowEvent.RELEASE_BUTTON_SELECT
+]
+
+# buttons a person can press that the model can't, steps they are down in aren't recorded
+OTHER_BUTTONS = [
+    WindowEvent.PRESS_ARROW_DOWN,
+    WindowEvent.PRESS_ARROW_RIGHT,
+    WindowEvent.PRESS_BUTTON_START
+]
+
+OTHER_RELEASE_BUTTONS = [
+    WindowEvent.RELEASE_ARROW_DOWN,
+    WindowEvent.RELEASE_ARROW_RIGHT,
+    WindowEvent.RELEASE_BUTTON_START
+]
+
+
+def get_spaces(config):
+    """
+    Gets the observation and action spaces of the env for a config,
+    without starting the emulator
+
+    :param config (dict): configuration settings for the environment
+
+    :return: (spaces.Space), (spaces.Discrete)
+    """
+    action_space = spaces.Discrete(len(VALID_ACTIONS))
+
+    # hybrid observation is the playfield without the HUD, and the values the HUD shows read from memory
+    if config['observation'] == 'hybrid':
+        observation_space = spaces.Dict({
+            'screen': spaces.Box(low=0, high=255, shape=(PLAYFIELD_HEIGHT, 160, 1), dtype=np.uint8),
+            'ram': spaces.Box(low=0, high=1, shape=(len(RAM_FEATURES),), dtype=np.float32)
+        })
+    else:
+        observation_space = spaces.Box(low=0, high=255, shape=(144, 160, 3), dtype=np.uint8)
+
+    return observation_space, action_space
 
 
 class MetroidGymEnv(Env):
     """
     Gymnasium environment to be used by the model
     """
-    def __init__(self, config=None):
+    def __init__(self, config=None, curriculum=None, novelty=None):
         """
         Constructor for MetroidGymEnv
         
         :param config (dict): configuration settings for the environment
+        :param curriculum (Curriculum): picks the start state of every episode, None to pick once
+        :param novelty (RamNoveltySketch): memory state counts shared by all envs, None for no novelty reward
         """
         # check a config was passed in
         if config is None:
@@ -38,50 +153,35 @@ class MetroidGymEnv(Env):
         self.window_type = config['window']
         self.save_rewards = config['save_rewards']
         self.save_path = None if not self.save_rewards else config['save_path']
+        self.observation_type = config['observation']
+        self.record_path = config['record_path']
 
         self.id = str(uuid4())[:5]
 
         # initial state is initialized in self.reset()
         self.initial_state = None
+        self.state_index = None
+
+        self.curriculum = curriculum
+        self.novelty = novelty
 
         # initialize movement
-        self.valid_actions = [
-            # move samus
-            # WindowEvent.PRESS_ARROW_DOWN,
-            WindowEvent.PRESS_ARROW_LEFT,
-            WindowEvent.PRESS_ARROW_UP,
-            # WindowEvent.PRESS_ARROW_RIGHT,
-            
-            # jump/ shoot
-            WindowEvent.PRESS_BUTTON_A,
-            WindowEvent.PRESS_BUTTON_B,
-
-            # toggle missiles
-            WindowEvent.PRESS_BUTTON_SELECT
-        ]
-
-        self.release_actions = [
-            # WindowEvent.RELEASE_ARROW_DOWN,
-            WindowEvent.RELEASE_ARROW_LEFT,
-            WindowEvent.RELEASE_ARROW_UP,
-            # WindowEvent.RELEASE_ARROW_RIGHT,
-            WindowEvent.RELEASE_BUTTON_A,
-            WindowEvent.RELEASE_BUTTON_B,
-            WindowEvent.RELEASE_BUTTON_SELECT
-        ]
+        self.valid_actions = VALID_ACTIONS
+        self.release_actions = RELEASE_ACTIONS
 
         self.last_pressed = None
 
+        # buttons held down by a person playing, in the order they were pressed
+        self.held_actions = []
+        self.held_other_buttons = []
+
         # load in the emulator and game
         self.pyboy = PyBoy(self.rom_path, window_type=self.window_type)
 
 
         # set gym attributes
-        self.action_space = spaces.Discrete(len(self.valid_actions))
+        self.observation_space, self.action_space = get_spaces(config)
         self.reward_range = (-math.inf, math.inf)
-        # observation is current frame and previous frame to give cnn sense of movement
-        self.obs_shape = (144, 160, 3)
-        self.observation_space = spaces.Box(low=0, high=255, shape=self.obs_shape, dtype=np.uint8)
 
         # initialized in self.reset()
         self.previous_frame = None # (144, 160)
@@ -103,6 +203,7 @@ class MetroidGymEnv(Env):
             'metroids_remaining': 200,
             'enemies_killed': 10,
             'exploration': 1,
+            'novelty': 1,
             'target_distance': 2,
             'target_reached': 10,
             'checkpoint_passed': 10,
@@ -110,6 +211,10 @@ class MetroidGymEnv(Env):
             'deaths': 1,
             'damage_taken': 1
         }
+
+        # config can override any of the weights
+        if config['reward_weights'] is not None:
+            self.reward_weights.update(config['reward_weights'])
         
         self.rewards_df = None if not self.save_rewards else pd.DataFrame(self.rewards, index=[0])
         self.rewardw_df = None if not self.save_rewards else pd.DataFrame(self.reward_weights, index=[0])
@@ -128,15 +233,30 @@ class MetroidGymEnv(Env):
 
         self.explored_coordinates = {}
 
+        # sum of novelty bonuses this episode
+        self.novelty_total = 0
+
         self.deaths = 0
         self.dead = False
 
+        # episode results reported to the curriculum
+        self.episode_return = 0
+        self.episode_start_deaths = 0
+        self.checkpoints_passed = 0
+
         self.steps_taken = 0
 
         self.resets = -1
 
         if self.save_rewards:
             self.init_save_file()
+
+        # observation the next action is chosen from, initialized in self.reset()
+        self.last_obs = None
+
+        self.recorder = None
+        if self.record_path is not None:
+            self.recorder = TransitionRecorder(Path(self.record_path) / self.id, self.observation_space)
             
         # start the game from initial state
         self.reset()
@@ -158,10 +278,81 @@ class MetroidGymEnv(Env):
         self.steps_taken += 1
         self.act(action)
 
+        return self.finish_step(action)
+
+
+    def human_step(self):
+        """
+        Advances the game by one step while a person plays in the SDL2 window.
+        The action is the button pressed last during the step, or the button
+        held the longest if none were pressed. It is None if no button is down.
+        The model can only press one of self.valid_actions at a time, so steps
+        where any of OTHER_BUTTONS was down (i.e. RIGHT + A) have no action
+        either, instead of being recorded as a different action.
+
+        :return: (ObsType), (SupportsFloat), (bool), (bool), (dict)
+        """
+        self.steps_taken += 1
+
+        pressed = []
+        other_pressed = False
+        for i in range(self.action_frequency):
+            self.advance_frame(i)
+
+            for event in self.pyboy.get_input():
+                if event in self.valid_actions:
+                    a = self.valid_actions.index(event)
+                    pressed.append(a)
+                    self.held_actions.append(a)
+                elif event in self.release_actions:
+                    a = self.release_actions.index(event)
+                    if a in self.held_actions:
+                        self.held_actions.remove(a)
+                elif event in OTHER_BUTTONS:
+                    b = OTHER_BUTTONS.index(event)
+                    other_pressed = True
+                    self.held_other_buttons.append(b)
+                elif event in OTHER_RELEASE_BUTTONS:
+                    b = OTHER_RELEASE_BUTTONS.index(event)
+                    if b in self.held_other_buttons:
+                        self.held_other_buttons.remove(b)
+
+        other_buttons = other_pressed or len(self.held_other_buttons) > 0
+
+        action = None
+        if other_buttons:
+            pass
+        elif pressed:
+            action = pressed[-1]
+        elif self.held_actions:
+            action = self.held_actions[0]
+
+        obs, reward_gain, terminated, truncated, info = self.finish_step(action)
+        info['action'] = action
+        info['other_buttons'] = other_buttons
+
+        return obs, reward_gain, terminated, truncated, info
+
+
+    def finish_step(self, action):
+        """
+        Gets the observation, reward and if the episode is done after an action,
+        and records the transition
+
+        :param action (int): action that was taken, None to skip recording
+
+        :return: (ObsType), (SupportsFloat), (bool), (bool), (dict)
+        """
         obs = self.render()
         reward_gain = self.update_rewards()
         terminated = self.check_if_done()
 
+        self.episode_return += reward_gain
+
+        if self.recorder is not None and action is not None:
+            self.recorder.record(self.last_obs, action, reward_gain, terminated)
+        self.last_obs = obs
+
         return obs, reward_gain, terminated, False, {}
 
 
@@ -179,13 +370,25 @@ class MetroidGymEnv(Env):
         """
         self.resets += 1
         self.seed = seed
+
+        # report the episode that just ended
+        if self.curriculum is not None and self.steps_taken > 0:
+            self.curriculum.record(self.state_index,
+                                   self.checkpoints_passed > 0,
+                                   self.deaths > self.episode_start_deaths,
+                                   self.episode_return)
+
         self.steps_taken = 0
 
-        # choose random start state only when env is initialized
-        if self.resets == 0:
+        # curriculum chooses every start state, otherwise choose random start state only when env is initialized
+        if self.curriculum is not None:
+            self.state_index = self.curriculum.sample()
+            self.initial_state = self.states[self.state_index]
+        elif self.resets == 0:
             i = randint(0, len(self.states)-1)
             state = self.states[i]
             self.initial_state = state
+            self.state_index = i
 
         with open(self.initial_state, "rb") as f:
             self.pyboy.load_state(f)
@@ -204,6 +407,12 @@ class MetroidGymEnv(Env):
 
         self.explored_coordinates = {}
 
+        self.episode_return = 0
+        self.episode_start_deaths = self.deaths
+        self.checkpoints_passed = 0
+
+        self.novelty_total = 0
+
         self.reached_target = False
         x = self.read_memory(mem.PREV_SAMUS_X_SCREEN)
         y = self.read_memory(mem.PREV_SAMUS_Y_SCREEN)
@@ -214,7 +423,9 @@ class MetroidGymEnv(Env):
         screen = self.pyboy.botsupport_manager().screen()
         self.previous_frame = screen.screen_ndarray()[:, :, 0]
 
-        return self.render(), {}
+        self.last_obs = self.render()
+
+        return self.last_obs, {}
 
 
     def render(self):
@@ -234,9 +445,25 @@ class MetroidGymEnv(Env):
         # obs = np.array([frame_pixels, self.previous_frame])
         # obs = np.reshape(obs, self.obs_shape)
 
+        if self.observation_type == 'hybrid':
+            return {
+                'screen': frame_pixels[:PLAYFIELD_HEIGHT, :, :1],
+                'ram': self.get_ram_features()
+            }
+
         return frame_pixels
 
 
+    def get_ram_features(self):
+        """
+        Reads the hybrid observation memory values, scaled to [0, 1]
+
+        :return: (np.ndarray)
+        """
+        values = [self.read_memory(address) for address in RAM_FEATURES]
+        return np.array(values, dtype=np.float32) / 255
+
+
     def close(self):
         """
         Closes the environment, important when external software is used, 
@@ -244,9 +471,38 @@ class MetroidGymEnv(Env):
 
         https://gymnasium.farama.org/api/env/
         """
+        if self.recorder is not None:
+            self.recorder.close()
+
         self.pyboy.stop()
 
 
+    def get_snapshot(self):
+        """
+        Saves the emulator state and the progress of the current episode
+
+        :return: (dict)
+        """
+        f = io.BytesIO()
+        self.pyboy.save_state(f)
+
+        attributes = {name: getattr(self, name) for name in SNAPSHOT_ATTRIBUTES}
+
+        return {'emulator': f.getvalue(), 'attributes': attributes}
+
+
+    def load_snapshot(self, snapshot):
+        """
+        Puts the env back in a state saved with self.get_snapshot()
+
+        :param snapshot (dict): snapshot to load
+        """
+        self.pyboy.load_state(io.BytesIO(snapshot['emulator']))
+
+        for name, value in snapshot['attributes'].items():
+            setattr(self, name, value)
+
+
     def act(self, action):
         """
         Sends the given action to the emulator
@@ -258,25 +514,34 @@ class MetroidGymEnv(Env):
         self.pyboy.send_input(self.valid_actions[action])
 
         for i in range(self.action_frequency):
-            # advance game 1 frame
-            self.pyboy.tick()
+            self.advance_frame(i)
 
-            # check if enemy has died
-            if self.has_enemy_died():
-                self.enemies_killed += 1
+        # release button
+        self.pyboy.send_input(self.release_actions[action])
 
-            # check hp to see if game needs to be reset
-            if self.samus_is_dead():
-                self.deaths += 1
-                self.dead = True
 
-            # get previous frame before next step
-            if i == 2 - self.action_frequency:
-                screen = self.pyboy.botsupport_manager().screen()
-                self.previous_frame = screen.screen_ndarray()[:, :, 0]
+    def advance_frame(self, i):
+        """
+        Advances the game 1 frame and checks what happened during it
 
-        # release button
-        self.pyboy.send_input(self.release_actions[action])
+        :param i (int): index of the frame in the current step
+        """
+        # advance game 1 frame
+        self.pyboy.tick()
+
+        # check if enemy has died
+        if self.has_enemy_died():
+            self.enemies_killed += 1
+
+        # check hp to see if game needs to be reset
+        if self.samus_is_dead():
+            self.deaths += 1
+            self.dead = True
+
+        # get previous frame before next step
+        if i == 2 - self.action_frequency:
+            screen = self.pyboy.botsupport_manager().screen()
+            self.previous_frame = screen.screen_ndarray()[:, :, 0]
 
 
     def has_enemy_died(self):
@@ -372,6 +637,7 @@ class MetroidGymEnv(Env):
             'metroids_remaining': self.get_metroids_remaining_reward(),
             'enemies_killed': self.get_enemies_killed_reward(),
             # 'exploration': self.get_exploration_reward(),
+            'novelty': self.get_novelty_reward(),
             # 'target_distance': self.get_target_distance_reward(),
             # 'target_reached': self.get_target_reached_reward(),
             'checkpoint_passed': self.get_checkpoint_passed_reward(),
@@ -504,6 +770,19 @@ class MetroidGymEnv(Env):
         return reward
 
 
+    def get_novelty_reward(self):
+        """
+        Counts the current memory state in the shared sketch, and returns the
+        sum of the novelty bonuses of every state visited this episode
+
+        :return: (float)
+        """
+        if self.novelty is not None:
+            self.novelty_total += self.novelty.bonus(self.read_memory)
+
+        return self.novelty_total
+
+
     def get_target_distance_reward(self):
         """
         Gets the distance from Samus to the target and returns the reward
@@ -555,6 +834,7 @@ class MetroidGymEnv(Env):
         curr = (x,y)
         if curr[0] == next_checkpoint[0] and curr[1] == next_checkpoint[1]:
             self.previous_checkpoint = curr
+            self.checkpoints_passed += 1
             reward = 1
 
         return reward
@@ -0,0 +1,128 @@
+from hashlib import blake2b
+import math
+
+import numpy as np
+
+import memory_constants as mem
+from shared_arrays import SharedArray
+
+
+# memory values that make up a state for the novelty count. pixel coordinates
+# are bucketed so moving a few pixels doesn't count as a new state
+HASHED_ADDRESSES = [
+    mem.PREV_SAMUS_X_SCREEN,
+    mem.PREV_SAMUS_Y_SCREEN,
+    mem.PREV_SAMUS_X_PIXEL,
+    mem.PREV_SAMUS_Y_PIXEL,
+    mem.CURRENT_ARMOR_UPGRADE,
+    mem.CURRENT_BEAM_UPGRADE,
+    mem.GLOBAL_METROIDS_REMAINING,
+    mem.MAX_ENERGY_TANKS,
+    mem.MAX_MISSILES_LOW,
+    mem.MAX_MISSILES_HIGH
+]
+# which enemies and items of the area are alive, killed or collected
+HASHED_ADDRESSES += range(mem.ENEMY_SPAWN_FLAGS, mem.ENEMY_SPAWN_FLAGS + mem.N_ENEMY_SPAWN_FLAGS)
+# which enemies are loaded. the rest of each slot (position, animation, timers)
+# changes every frame and is masked out
+ENEMY_SLOT_OFFSETS = [0x1D, 0x1E, 0x1F]
+HASHED_ADDRESSES += [mem.ENEMY_SLOTS + slot * mem.ENEMY_SLOT_SIZE + offset
+                     for slot in range(mem.N_ENEMY_SLOTS)
+                     for offset in ENEMY_SLOT_OFFSETS]
+
+PIXEL_BUCKET_SIZE = 32
+# positions of the pixel coordinates in the state key
+PIXEL_INDICES = [HASHED_ADDRESSES.index(mem.PREV_SAMUS_X_PIXEL), HASHED_ADDRESSES.index(mem.PREV_SAMUS_Y_PIXEL)]
+
+
+class RamNoveltySketch:
+    """
+    Count-min sketch of how often each memory state has been seen, shared by
+    every env through shared memory. Memory use is fixed by depth and width,
+    no matter how many states are seen. Updates aren't locked, so counts from
+    envs updating the same cell at once can be lost, which only makes the
+    estimate slightly low.
+    """
+    def __init__(self, depth=4, width=2**20):
+        """
+        Constructor for RamNoveltySketch
+
+        :param depth (int): number of hash rows, more rows lower the overestimate
+        :param width (int): number of counters in each row
+        """
+        self.depth = depth
+        self.width = width
+
+        self.counts = SharedArray((depth, width), np.uint32)
+
+
+    def state_key(self, read_memory):
+        """
+        Reads the hashed memory values into a key
+
+        :param read_memory (Callable): function that reads a memory address
+
+        :return: (bytes)
+        """
+        values = bytearray(map(read_memory, HASHED_ADDRESSES))
+        for i in PIXEL_INDICES:
+            values[i] //= PIXEL_BUCKET_SIZE
+
+        return bytes(values)
+
+
+    def columns(self, key):
+        """
+        Gets the index of the key's counter in each row, into the flattened
+        counts. Python's hash() is different in every process, so a fixed hash
+        is used to match across envs.
+
+        :param key (bytes): state key
+
+        :return: (list[int])
+        """
+        digest = int.from_bytes(blake2b(key, digest_size=8).digest(), 'little')
+        h1 = digest & 0xFFFFFFFF
+        # odd step so every row gets a different counter
+        h2 = (digest >> 32) | 1
+
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+
+    def visit(self, key):
+        """
+        Counts a visit to the state and returns how often it has been seen
+
+        :param key (bytes): state key
+
+        :return: (int)
+        """
+        # a flat memoryview reads and writes python ints, much faster than numpy indexing for a few counters
+        counts = self.counts.array.reshape(-1).data
+
+        seen = None
+        for i in self.columns(key):
+            count = counts[i] + 1
+            counts[i] = count
+            if seen is None or count < seen:
+                seen = count
+
+        return seen
+
+
+    def bonus(self, read_memory):
+        """
+        Counts the current state and returns its novelty bonus, 1 / sqrt(visits)
+
+        :param read_memory (Callable): function that reads a memory address
+
+        :return: (float)
+        """
+        return 1 / math.sqrt(self.visit(self.state_key(read_memory)))
+
+
+    def close(self):
+        """
+        Frees the shared counts, only call from the process that created the sketch
+        """
+        self.counts.close()
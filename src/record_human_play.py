@@ -0,0 +1,23 @@
+from metroid_env import MetroidGymEnv
+import configs as c
+
+
+if __name__ == "__main__":
+
+    # play with the keyboard in the SDL2 window, every step with one of the
+    # env's buttons down is recorded to record_path. steps where RIGHT, DOWN
+    # or START is down are skipped, the model can't press them
+    cfg = dict(c.replay, record_path='recordings/human')
+
+    env = MetroidGymEnv(cfg)
+
+    try:
+        while True:
+            obs, reward, terminated, truncated, info = env.human_step()
+
+            if terminated:
+                env.reset()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        env.close()
@@ -0,0 +1,469 @@
+import io
+import json
+import pickle
+import socket
+import struct
+import time
+
+import numpy as np
+
+from gymnasium import spaces
+
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+
+# message types, every message is a HEADER followed by its payload
+HELLO = 0       # worker -> learner: empty
+CONFIG = 1      # learner -> worker: json {config, rank, seed}
+READY = 2       # worker -> learner: OBS_SIZE
+RESET = 3       # learner -> worker: SEED
+OBS = 4         # worker -> learner: observation bytes
+STEP = 5        # learner -> worker: ACTION
+TRANSITION = 6  # worker -> learner: TRANSITION_HEADER, observation bytes, reset observation bytes if done
+CALL = 7        # learner -> worker: pickled (kind, args)
+RESULT = 8      # worker -> learner: pickled (ok, value), only numpy arrays and builtin types are unpickled
+CLOSE = 9       # learner -> worker: empty
+
+# (message type, payload length)
+HEADER = struct.Struct("!BI")
+# seed for the next reset, -1 for None
+SEED = struct.Struct("!q")
+ACTION = struct.Struct("!i")
+# (reward, terminated, truncated)
+TRANSITION_HEADER = struct.Struct("!f??")
+# bytes of an encoded observation, checked against the learner's observation space
+OBS_SIZE = struct.Struct("!I")
+
+# the only calls workers answer, everything else is refused
+GET_ATTR_NAMES = {"render_mode", "initial_state", "state_index", "steps_taken", "total_reward", "deaths"}
+ENV_METHOD_NAMES = {"get_snapshot", "load_snapshot"}
+
+# globals numpy arrays and scalars are pickled with
+NUMPY_GLOBALS = {
+    ("numpy.core.multiarray", "_reconstruct"),
+    ("numpy.core.multiarray", "scalar"),
+    ("numpy._core.multiarray", "_reconstruct"),
+    ("numpy._core.multiarray", "scalar"),
+    ("numpy", "ndarray"),
+    ("numpy", "dtype")
+}
+
+
+def send_message(sock, msg_type, payload=b""):
+    """
+    Sends a message with its header in a single write
+
+    :param sock (socket.socket): connected socket
+    :param msg_type (int): one of the message types
+    :param payload (bytes): message body
+    """
+    sock.sendall(HEADER.pack(msg_type, len(payload)) + payload)
+
+
+def recv_exact(sock, n):
+    """
+    Reads exactly n bytes from the socket
+
+    :param sock (socket.socket): connected socket
+    :param n (int): number of bytes to read
+
+    :return: (bytearray)
+    """
+    buf = bytearray(n)
+    view = memoryview(buf)
+    while n > 0:
+        read = sock.recv_into(view, n)
+        if read == 0:
+            raise ConnectionError("Socket was closed by the other side")
+        view = view[read:]
+        n -= read
+
+    return buf
+
+
+def recv_message(sock, expected=None):
+    """
+    Reads one message from the socket
+
+    :param sock (socket.socket): connected socket
+    :param expected (int): message type that has to be received, None for any
+
+    :return: (int), (bytearray)
+    """
+    msg_type, length = HEADER.unpack(recv_exact(sock, HEADER.size))
+    payload = recv_exact(sock, length)
+
+    if expected is not None and msg_type != expected:
+        raise ConnectionError(f"Expected message type {expected}, received {msg_type}")
+
+    return msg_type, payload
+
+
+class SafeUnpickler(pickle.Unpickler):
+    """
+    Unpickler that only builds builtin types and numpy arrays, so data from
+    a worker can't run code on the learner
+    """
+    def find_class(self, module, name):
+        if (module, name) in NUMPY_GLOBALS:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Refusing to unpickle {module}.{name} from a rollout worker")
+
+
+def safe_loads(data):
+    """
+    Unpickles data received from a worker
+
+    :param data (bytes): pickled data
+
+    :return: (Any)
+    """
+    try:
+        return SafeUnpickler(io.BytesIO(data)).load()
+    except pickle.UnpicklingError:
+        raise
+    except Exception as e:
+        # truncated or garbage data can fail in many ways, they all mean the same thing
+        raise pickle.UnpicklingError(f"Invalid data from a rollout worker: {e!r}") from e
+
+
+class ObsCodec:
+    """
+    Packs observations of a Box or Dict space into raw bytes and back
+    """
+    def __init__(self, observation_space):
+        """
+        Constructor for ObsCodec
+
+        :param observation_space (spaces.Space): Box or Dict of Boxes
+        """
+        if isinstance(observation_space, spaces.Dict):
+            self.keys = list(observation_space.spaces.keys())
+            subspaces = [observation_space[k] for k in self.keys]
+        else:
+            self.keys = None
+            subspaces = [observation_space]
+
+        self.layout = [(s.shape, np.dtype(s.dtype)) for s in subspaces]
+        self.size = sum(int(np.prod(shape)) * dtype.itemsize for shape, dtype in self.layout)
+
+
+    def encode(self, obs):
+        """
+        Packs an observation into bytes
+
+        :param obs (np.ndarray | dict): observation from the env
+
+        :return: (bytes)
+        """
+        arrays = [obs] if self.keys is None else [obs[k] for k in self.keys]
+        return b"".join(np.ascontiguousarray(a, dtype=dtype).tobytes()
+                        for a, (_, dtype) in zip(arrays, self.layout))
+
+
+    def decode(self, payload, offset=0):
+        """
+        Unpacks an observation from bytes
+
+        :param payload (bytearray): message body
+        :param offset (int): byte position of the observation in the payload
+
+        :return: (np.ndarray | dict)
+        """
+        arrays = []
+        for shape, dtype in self.layout:
+            count = int(np.prod(shape))
+            arrays.append(np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(shape))
+            offset += count * dtype.itemsize
+
+        if self.keys is None:
+            return arrays[0]
+        return dict(zip(self.keys, arrays))
+
+
+    def stack(self, observations):
+        """
+        Stacks the observations of every env into one batch
+
+        :param observations (list): observation of each env
+
+        :return: (np.ndarray | dict)
+        """
+        if self.keys is None:
+            return np.stack(observations)
+        return {k: np.stack([o[k] for o in observations]) for k in self.keys}
+
+
+class RemoteVecEnv(VecEnv):
+    """
+    Vectorized env where every env runs in a rollout worker process that
+    connects to the learner over TCP, see rollout_worker.py.
+    Workers can run on any host that can reach the learner. When a worker
+    dies its episode is ended and the next worker to connect takes its place.
+    """
+    def __init__(self, config, n_envs, observation_space, action_space, host="127.0.0.1", port=5555, seed=0, timeout=60,
+                 accept_timeout=300):
+        """
+        Constructor for RemoteVecEnv, blocks until n_envs workers have connected
+
+        :param config (dict): configuration settings sent to every worker
+        :param n_envs (int): number of workers to wait for
+        :param observation_space (spaces.Space): observation space of the workers' envs
+        :param action_space (spaces.Discrete): action space of the workers' envs
+        :param host (str): interface to listen on, '0.0.0.0' to accept workers from other machines
+        :param port (int): port to listen on
+        :param seed (int): seed of the first worker, each next worker adds 1
+        :param timeout (float): seconds to wait on a worker before it is considered dead
+        :param accept_timeout (float): seconds to wait for a worker to connect before giving up on training
+        """
+        self.config = config
+        self.base_seed = seed
+        self.timeout = timeout
+        self.accept_timeout = accept_timeout
+
+        self.codec = ObsCodec(observation_space)
+
+        self.server = socket.create_server((host, port), backlog=n_envs)
+        self.server.settimeout(accept_timeout)
+        print(f"Waiting for {n_envs} rollout workers on port {port}")
+
+        self.sockets = [None] * n_envs
+        for i in range(n_envs):
+            self.sockets[i] = self.accept_worker(i)
+
+        self.last_obs = [None] * n_envs
+        self.waiting = False
+
+        super().__init__(n_envs, observation_space, action_space)
+
+
+    def accept_worker(self, rank):
+        """
+        Waits for the next worker to connect and sends it the config. Workers
+        that fail the handshake are turned away and the next one is waited for.
+        Raises if no worker completes the handshake within accept_timeout.
+
+        :param rank (int): slot the worker will fill
+
+        :return: (socket.socket)
+        """
+        deadline = time.monotonic() + self.accept_timeout
+        while True:
+            try:
+                self.server.settimeout(max(deadline - time.monotonic(), 0.001))
+                conn, addr = self.server.accept()
+            except socket.timeout:
+                raise Exception(f"No rollout worker connected to fill slot {rank} "
+                                f"within {self.accept_timeout} seconds") from None
+            conn.settimeout(self.timeout)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            try:
+                recv_message(conn, HELLO)
+                setup = {"config": self.config, "rank": rank, "seed": self.base_seed + rank}
+                send_message(conn, CONFIG, json.dumps(setup).encode())
+                _, payload = recv_message(conn, READY)
+                obs_size, = OBS_SIZE.unpack(payload)
+            except (OSError, struct.error):
+                conn.close()
+                continue
+
+            if obs_size != self.codec.size:
+                print(f"Rollout worker from {addr[0]} sends {obs_size} byte observations, "
+                      f"expected {self.codec.size}, turning it away")
+                conn.close()
+                continue
+
+            print(f"Rollout worker {rank} connected from {addr[0]}")
+            return conn
+
+
+    def drop_worker(self, rank):
+        """
+        Closes the connection to a worker that died
+
+        :param rank (int): slot of the worker
+        """
+        if self.sockets[rank] is None:
+            return
+
+        print(f"Rollout worker {rank} disconnected, waiting for a new worker")
+        self.sockets[rank].close()
+        self.sockets[rank] = None
+
+
+    def reset_worker(self, rank, seed=None):
+        """
+        Resets the env of a worker, replacing the worker until one succeeds
+
+        :param rank (int): slot of the worker
+        :param seed (int): seed for the reset
+
+        :return: (np.ndarray | dict)
+        """
+        while True:
+            if self.sockets[rank] is None:
+                self.sockets[rank] = self.accept_worker(rank)
+
+            try:
+                send_message(self.sockets[rank], RESET, SEED.pack(-1 if seed is None else seed))
+                _, payload = recv_message(self.sockets[rank], OBS)
+                obs = self.codec.decode(payload)
+                self.last_obs[rank] = obs
+                return obs
+            except (OSError, ValueError):
+                self.drop_worker(rank)
+
+
+    def reset(self):
+        """
+        Resets every env
+
+        :return: (np.ndarray | dict)
+        """
+        for i in range(self.num_envs):
+            if self.sockets[i] is None:
+                continue
+            try:
+                send_message(self.sockets[i], RESET, SEED.pack(-1 if self._seeds[i] is None else self._seeds[i]))
+            except OSError:
+                self.drop_worker(i)
+
+        observations = []
+        for i in range(self.num_envs):
+            try:
+                _, payload = recv_message(self.sockets[i], OBS)
+                obs = self.codec.decode(payload)
+                self.last_obs[i] = obs
+            except (OSError, AttributeError, ValueError):
+                self.drop_worker(i)
+                obs = self.reset_worker(i, self._seeds[i])
+            observations.append(obs)
+
+        # seeds are only used once
+        self._reset_seeds()
+        return self.codec.stack(observations)
+
+
+    def step_async(self, actions):
+        """
+        Sends an action to every worker without waiting for the results
+
+        :param actions (np.ndarray): action of each env
+        """
+        for i in range(self.num_envs):
+            if self.sockets[i] is None:
+                continue
+            try:
+                send_message(self.sockets[i], STEP, ACTION.pack(int(actions[i])))
+            except OSError:
+                self.drop_worker(i)
+        self.waiting = True
+
+
+    def step_wait(self):
+        """
+        Waits for the results of the actions sent in step_async. Envs that end
+        are reset by their worker, the last observation is kept in the info.
+
+        :return: (np.ndarray | dict), (np.ndarray), (np.ndarray), (list[dict])
+        """
+        observations = []
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = [{} for _ in range(self.num_envs)]
+
+        for i in range(self.num_envs):
+            try:
+                _, payload = recv_message(self.sockets[i], TRANSITION)
+                reward, terminated, truncated = TRANSITION_HEADER.unpack_from(payload)
+                obs = self.codec.decode(payload, TRANSITION_HEADER.size)
+                if terminated or truncated:
+                    reset_obs = self.codec.decode(payload, TRANSITION_HEADER.size + self.codec.size)
+            except (OSError, AttributeError, ValueError, struct.error):
+                # episode of a dead worker is cut short
+                self.drop_worker(i)
+                infos[i]["terminal_observation"] = self.last_obs[i]
+                observations.append(self.reset_worker(i))
+                dones[i] = True
+                infos[i]["TimeLimit.truncated"] = True
+                continue
+
+            rewards[i] = reward
+            dones[i] = terminated or truncated
+            if dones[i]:
+                infos[i]["terminal_observation"] = obs
+                infos[i]["TimeLimit.truncated"] = truncated and not terminated
+                obs = reset_obs
+
+            self.last_obs[i] = obs
+            observations.append(obs)
+
+        self.waiting = False
+        return self.codec.stack(observations), rewards, dones, infos
+
+
+    def close(self):
+        """
+        Tells every worker to shut down and stops listening
+        """
+        for sock in self.sockets:
+            if sock is None:
+                continue
+            try:
+                send_message(sock, CLOSE)
+            except OSError:
+                pass
+            sock.close()
+
+        self.server.close()
+
+
+    def call(self, rank, kind, args):
+        """
+        Runs a call on the env of a worker. Returns None if the worker is dead,
+        it is replaced on the next step.
+
+        :param rank (int): slot of the worker
+        :param kind (str): 'get_attr' or 'env_method'
+        :param args (tuple): arguments of the call
+
+        :return: (Any)
+        """
+        if self.sockets[rank] is None:
+            return None
+
+        try:
+            send_message(self.sockets[rank], CALL, pickle.dumps((kind, args)))
+            _, payload = recv_message(self.sockets[rank], RESULT)
+            ok, value = safe_loads(payload)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            # garbage or truncated results are treated like a dead worker
+            self.drop_worker(rank)
+            return None
+
+        if not ok:
+            raise Exception(f"Rollout worker {rank} failed {kind} {args[0]}: {value}")
+        return value
+
+
+    def get_attr(self, attr_name, indices=None):
+        if attr_name not in GET_ATTR_NAMES:
+            raise AttributeError(f"Rollout workers don't share attribute '{attr_name}'")
+        return [self.call(i, "get_attr", (attr_name,)) for i in self._get_indices(indices)]
+
+
+    def set_attr(self, attr_name, value, indices=None):
+        raise AttributeError("Attributes of rollout worker envs can't be set")
+
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        if method_name not in ENV_METHOD_NAMES:
+            raise AttributeError(f"Rollout workers don't run method '{method_name}'")
+        return [self.call(i, "env_method", (method_name, method_args, method_kwargs))
+                for i in self._get_indices(indices)]
+
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        # workers run their env without wrappers
+        return [False for _ in self._get_indices(indices)]
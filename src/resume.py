@@ -0,0 +1,226 @@
+import os
+import json
+import pickle
+import shutil
+
+import numpy as np
+
+from stable_baselines3 import DQN
+from stable_baselines3.common.callbacks import BaseCallback
+
+
+# replay buffer arrays, observations are dicts of arrays for hybrid observations
+BUFFER_FIELDS = ["observations", "next_observations", "actions", "rewards", "dones", "timeouts"]
+
+
+def attach_memmap_buffer(replay_buffer, path, mode):
+    """
+    Replaces the arrays of a replay buffer with memory mapped files, so the
+    buffer is written to disk as it is filled and can be loaded lazily
+
+    :param replay_buffer (ReplayBuffer): buffer of the model
+    :param path (Path): directory of the files
+    :param mode (str): 'w+' to create new files, 'r+' to open existing ones
+    """
+    path.mkdir(parents=True, exist_ok=True)
+
+    for name in BUFFER_FIELDS:
+        array = getattr(replay_buffer, name, None)
+        # next_observations is None when optimize_memory_usage is set
+        if array is None:
+            continue
+
+        if isinstance(array, dict):
+            memmaps = {k: np.memmap(path / f"{name}_{k}.dat", dtype=v.dtype, mode=mode, shape=v.shape)
+                       for k, v in array.items()}
+            setattr(replay_buffer, name, memmaps)
+        else:
+            setattr(replay_buffer, name, np.memmap(path / f"{name}.dat", dtype=array.dtype, mode=mode, shape=array.shape))
+
+
+def flush_memmap_buffer(replay_buffer):
+    """
+    Writes the changed rows of a memory mapped replay buffer to disk
+
+    :param replay_buffer (ReplayBuffer): buffer of the model
+    """
+    for name in BUFFER_FIELDS:
+        array = getattr(replay_buffer, name, None)
+        if isinstance(array, dict):
+            for v in array.values():
+                v.flush()
+        elif isinstance(array, np.memmap):
+            array.flush()
+
+
+def write_atomic(path, data):
+    """
+    Writes to a temporary file first, so an interrupted write never replaces the last good file
+
+    :param path (Path): file to write
+    :param data (bytes): contents of the file
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_training_state(model, path, last_obs, curriculum=None, novelty=None):
+    """
+    Saves everything needed to continue training: the model with its optimizer
+    and timestep counters, every env's emulator state, and the replay buffer.
+    Every save is written to a new directory, and the 'latest' file is only
+    pointed at it once it is complete, so an interrupted save leaves the last
+    one intact. The replay buffer files are shared by every save and keep
+    being written after it, so a resumed buffer can hold transitions newer
+    than the save, which are still valid transitions.
+
+    :param model (DQN): model being trained
+    :param path (Path): directory to save to
+    :param last_obs (np.ndarray | dict): observation the envs are currently at
+    :param curriculum (Curriculum): start state curriculum, None if not used
+    :param novelty (RamNoveltySketch): memory state counts, None if not used
+
+    :return: (bool) False if an env couldn't be saved and nothing was written
+    """
+    # a dead remote worker has no snapshot, its env couldn't be restored
+    snapshots = model.get_env().env_method("get_snapshot")
+    missing = [i for i, snapshot in enumerate(snapshots) if snapshot is None]
+    if missing:
+        print(f"Skipped saving training state, envs {missing} didn't return their state")
+        return False
+
+    save_name = f"save_{model.num_timesteps}"
+    save_path = path / save_name
+    if save_path.exists():
+        shutil.rmtree(save_path)
+    save_path.mkdir(parents=True)
+
+    # model is saved with the observation that matches the saved env states
+    prev_last_obs, prev_last_original_obs = model._last_obs, model._last_original_obs
+    model._last_obs, model._last_original_obs = last_obs, last_obs
+    model.save(save_path / "model.zip")
+    model._last_obs, model._last_original_obs = prev_last_obs, prev_last_original_obs
+
+    with open(save_path / "env_states.pkl", "wb") as f:
+        pickle.dump(snapshots, f)
+
+    if curriculum is not None:
+        curriculum.stats.array.tofile(save_path / "curriculum.dat")
+        curriculum.progress.array.tofile(save_path / "curriculum_progress.dat")
+    if novelty is not None:
+        novelty.counts.array.tofile(save_path / "novelty.dat")
+
+    flush_memmap_buffer(model.replay_buffer)
+
+    meta = {
+        # total of the run, set by model.learn()
+        "total_timesteps": model._total_timesteps,
+        "num_timesteps": model.num_timesteps,
+        "n_envs": model.n_envs,
+        "buffer_pos": model.replay_buffer.pos,
+        "buffer_full": model.replay_buffer.full
+    }
+    with open(save_path / "meta.json", "w") as f:
+        json.dump(meta, f, indent=4)
+
+    write_atomic(path / "latest", save_name.encode())
+
+    # older saves are only removed once the new one is in place
+    for old_path in path.glob("save_*"):
+        if old_path.name != save_name:
+            shutil.rmtree(old_path)
+
+    return True
+
+
+def load_training_state(path, env, curriculum=None, novelty=None, **kwargs):
+    """
+    Loads a model saved with save_training_state and puts the envs back in
+    the states they were saved in
+
+    :param path (Path): directory the state was saved to
+    :param env (VecEnv): envs to continue training on, must be as many as were saved
+    :param curriculum (Curriculum): start state curriculum, None if not used
+    :param novelty (RamNoveltySketch): memory state counts, None if not used
+    :param kwargs: attributes to change on the loaded model
+
+    :return: (DQN), (int) total timesteps of the run
+    """
+    if not (path / "latest").exists():
+        raise Exception(f"No complete training state was saved to {path}")
+
+    replay_buffer_path = path / "replay_buffer"
+    path = path / (path / "latest").read_text()
+
+    with open(path / "meta.json") as f:
+        meta = json.load(f)
+
+    if meta["n_envs"] != env.num_envs:
+        raise Exception(f"Session was trained with {meta['n_envs']} envs, but {env.num_envs} were given")
+
+    # force_reset=False keeps the saved last observation, so the envs aren't reset
+    model = DQN.load(path / "model.zip", env=env, force_reset=False, **kwargs)
+
+    attach_memmap_buffer(model.replay_buffer, replay_buffer_path, "r+")
+    model.replay_buffer.pos = meta["buffer_pos"]
+    model.replay_buffer.full = meta["buffer_full"]
+
+    with open(path / "env_states.pkl", "rb") as f:
+        snapshots = pickle.load(f)
+    for i, snapshot in enumerate(snapshots):
+        env.env_method("load_snapshot", snapshot, indices=[i])
+
+    if curriculum is not None and (path / "curriculum.dat").exists():
+        stats = np.fromfile(path / "curriculum.dat", dtype=curriculum.stats.dtype)
+        curriculum.stats.array[:] = stats.reshape(curriculum.stats.shape)
+        progress = np.fromfile(path / "curriculum_progress.dat", dtype=curriculum.progress.dtype)
+        curriculum.progress.array[:] = progress.reshape(curriculum.progress.shape)
+
+    if novelty is not None and (path / "novelty.dat").exists():
+        counts = np.fromfile(path / "novelty.dat", dtype=novelty.counts.dtype)
+        novelty.counts.array[:] = counts.reshape(novelty.counts.shape)
+
+    print(f"Resumed training at {model.num_timesteps} of {meta['total_timesteps']} steps")
+    return model, meta["total_timesteps"]
+
+
+class ResumeCallback(BaseCallback):
+    """
+    Periodically saves the full training state so an interrupted run can be resumed.
+    Has to run before any callback that steps the training envs, i.e. an
+    EvalCallback evaluating on them, so the saved observation matches the envs.
+    """
+    def __init__(self, save_interval, path, curriculum=None, novelty=None, verbose=0):
+        """
+        Constructor for ResumeCallback
+
+        :param save_interval (int): number of timesteps, over all envs, between saves
+        :param path (Path): directory to save to
+        :param curriculum (Curriculum): start state curriculum, None if not used
+        :param novelty (RamNoveltySketch): memory state counts, None if not used
+        :param verbose (int): verbosity level
+        """
+        super().__init__(verbose)
+        self.save_interval = save_interval
+        self.path = path
+        self.curriculum = curriculum
+        self.novelty = novelty
+
+        # timesteps of the last save, set when training starts so resumed runs count from where they were
+        self.last_save = 0
+
+
+    def _on_training_start(self):
+        self.last_save = self.num_timesteps
+
+
+    def _on_step(self):
+        if self.num_timesteps - self.last_save >= self.save_interval:
+            self.last_save = self.num_timesteps
+            # the envs have already stepped to new_obs, but the model hasn't stored it yet
+            saved = save_training_state(self.model, self.path, self.locals["new_obs"], self.curriculum, self.novelty)
+            if saved and self.verbose > 0:
+                print(f"Saved training state at {self.model.num_timesteps} steps")
+        return True
@@ -0,0 +1,224 @@
+import argparse
+import json
+import pickle
+import socket
+import threading
+import time
+import traceback
+import multiprocessing as mp
+
+from remote_vec_env import (HELLO, CONFIG, READY, RESET, OBS, STEP, TRANSITION, CALL, RESULT, CLOSE,
+                            SEED, ACTION, TRANSITION_HEADER, OBS_SIZE, GET_ATTR_NAMES, ENV_METHOD_NAMES,
+                            ObsCodec, send_message, recv_message)
+from metroid_env import MetroidGymEnv
+
+
+def serve(sock, env_factory=MetroidGymEnv):
+    """
+    Runs the env for the learner on the other side of the socket
+
+    :param sock (socket.socket): socket connected to the learner
+    :param env_factory (Callable): builds the env from the config sent by the learner
+
+    :return: (bool) False if the learner closed the env, True otherwise
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    send_message(sock, HELLO)
+    _, payload = recv_message(sock, CONFIG)
+    setup = json.loads(payload)
+
+    env = env_factory(setup["config"])
+    env.reset(seed=setup["seed"])
+    codec = ObsCodec(env.observation_space)
+
+    try:
+        send_message(sock, READY, OBS_SIZE.pack(codec.size))
+
+        while True:
+            msg_type, payload = recv_message(sock)
+
+            if msg_type == STEP:
+                action, = ACTION.unpack(payload)
+                obs, reward, terminated, truncated, info = env.step(action)
+
+                message = TRANSITION_HEADER.pack(reward, terminated, truncated) + codec.encode(obs)
+                if terminated or truncated:
+                    obs, info = env.reset()
+                    message += codec.encode(obs)
+
+                send_message(sock, TRANSITION, message)
+
+            elif msg_type == RESET:
+                seed, = SEED.unpack(payload)
+                obs, info = env.reset(seed=None if seed < 0 else seed)
+                send_message(sock, OBS, codec.encode(obs))
+
+            elif msg_type == CALL:
+                kind, args = pickle.loads(payload)
+                try:
+                    result = (True, call(env, kind, args))
+                except Exception as e:
+                    result = (False, repr(e))
+                send_message(sock, RESULT, pickle.dumps(result))
+
+            elif msg_type == CLOSE:
+                return False
+
+    finally:
+        env.close()
+
+
+def call(env, kind, args):
+    """
+    Runs a VecEnv call on the env, only attributes and methods in
+    GET_ATTR_NAMES and ENV_METHOD_NAMES can be called
+
+    :param env (MetroidGymEnv): env of this worker
+    :param kind (str): 'get_attr' or 'env_method'
+    :param args (tuple): arguments of the call
+
+    :return: (Any)
+    """
+    if kind == "get_attr" and args[0] in GET_ATTR_NAMES:
+        return getattr(env, args[0])
+    if kind == "env_method" and args[0] in ENV_METHOD_NAMES:
+        method_name, method_args, method_kwargs = args
+        return getattr(env, method_name)(*method_args, **method_kwargs)
+
+    raise Exception(f"Call '{kind}' of '{args[0]}' is not allowed")
+
+
+def run_worker(host, port, retry_delay=1.0, env_factory=MetroidGymEnv):
+    """
+    Connects to the learner and serves an env until the learner closes it.
+    Reconnects if the connection is lost, so the learner can be restarted,
+    or if the env raises, with a new env.
+
+    :param host (str): address of the learner
+    :param port (int): port the learner listens on
+    :param retry_delay (float): seconds to wait between connection attempts
+    :param env_factory (Callable): builds the env from the config sent by the learner
+    """
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+        except OSError:
+            time.sleep(retry_delay)
+            continue
+
+        try:
+            if not serve(sock, env_factory):
+                return
+        except OSError:
+            print(f"Lost connection to learner at {host}:{port}, reconnecting")
+        except Exception:
+            traceback.print_exc()
+            print(f"Env crashed, reconnecting to learner at {host}:{port} with a new env")
+        finally:
+            sock.close()
+
+        time.sleep(retry_delay)
+
+
+class LocalWorkers:
+    """
+    Worker processes on this machine, restarted by a background thread
+    whenever one exits without being closed by the learner
+    """
+    def __init__(self, n_workers, port, host="127.0.0.1", env_factory=MetroidGymEnv, check_interval=1.0):
+        """
+        Constructor for LocalWorkers, starts the workers
+
+        :param n_workers (int): number of workers to start
+        :param port (int): port the learner listens on
+        :param host (str): address of the learner
+        :param env_factory (Callable): builds the env from the config, has to be picklable
+        :param check_interval (float): seconds between checks for exited workers
+        """
+        self.args = (host, port, 1.0, env_factory)
+        self.check_interval = check_interval
+        self.ctx = mp.get_context("spawn")
+
+        self.processes = [self.start_process() for _ in range(n_workers)]
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.supervise, daemon=True)
+        self.thread.start()
+
+
+    def start_process(self):
+        """
+        Starts a single worker process
+
+        :return: (mp.Process)
+        """
+        p = self.ctx.Process(target=run_worker, args=self.args)
+        p.start()
+        return p
+
+
+    def supervise(self):
+        """
+        Restarts workers that exit with an error until every worker exits cleanly or stop() is called
+        """
+        while not self.stopped.wait(self.check_interval):
+            for i, p in enumerate(self.processes):
+                if p.exitcode is not None and p.exitcode != 0:
+                    print(f"Local rollout worker {i} exited with code {p.exitcode}, restarting it")
+                    self.processes[i] = self.start_process()
+
+            if all(p.exitcode == 0 for p in self.processes):
+                return
+
+
+    def join(self):
+        """
+        Waits until every worker has been closed by the learner
+        """
+        self.thread.join()
+
+
+    def stop(self, timeout=10):
+        """
+        Stops restarting workers, and terminates the ones still running after timeout seconds
+
+        :param timeout (float): seconds to wait for each worker to exit
+        """
+        self.stopped.set()
+        self.thread.join()
+
+        for p in self.processes:
+            p.join(timeout=timeout)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+
+
+def start_local_workers(n_workers, port, host="127.0.0.1", env_factory=MetroidGymEnv):
+    """
+    Starts supervised workers as processes on this machine
+
+    :param n_workers (int): number of workers to start
+    :param port (int): port the learner listens on
+    :param host (str): address of the learner
+    :param env_factory (Callable): builds the env from the config, has to be picklable
+
+    :return: (LocalWorkers)
+    """
+    return LocalWorkers(n_workers, port, host, env_factory)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Run MetroidGymEnv for a learner started with train.py")
+    parser.add_argument("host", help="address of the learner")
+    parser.add_argument("--port", type=int, default=5555, help="port the learner listens on")
+    parser.add_argument("--workers", type=int, default=1, help="number of envs to run on this machine")
+    args = parser.parse_args()
+
+    workers = start_local_workers(args.workers, args.port, args.host)
+    try:
+        workers.join()
+    finally:
+        workers.stop()
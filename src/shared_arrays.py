@@ -0,0 +1,50 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArray:
+    """
+    Numpy array backed by shared memory. Pickling only sends the name of the
+    memory block, so subprocesses attach to the same array instead of a copy.
+    """
+    def __init__(self, shape, dtype, name=None):
+        """
+        Constructor for SharedArray
+
+        :param shape (tuple): shape of the array
+        :param dtype (np.dtype): type of the array
+        :param name (str): name of an existing block to attach to, None to create one
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        if self.owner:
+            self.array.fill(0)
+
+
+    def __getstate__(self):
+        return {"name": self.shm.name, "shape": self.shape, "dtype": self.dtype.str}
+
+
+    def __setstate__(self, state):
+        self.__init__(state["shape"], state["dtype"], name=state["name"])
+
+
+    def close(self):
+        """
+        Detaches from the memory block, and frees it if this process created it
+        """
+        # the array has to be released before the buffer can be closed
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
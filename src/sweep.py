@@ -0,0 +1,291 @@
+import os
+import json
+import math
+import queue
+import random
+from pathlib import Path
+from uuid import uuid4
+import multiprocessing as mp
+
+import numpy as np
+import torch
+
+from stable_baselines3 import DQN
+from stable_baselines3.common.vec_env import SubprocVecEnv, DummyVecEnv, vec_transpose
+from stable_baselines3.common.evaluation import evaluate_policy
+
+from train import make_env
+from metroid_env import get_spaces
+from feature_extractors import get_policy, get_policy_kwargs
+from curriculum import Curriculum
+from novelty import RamNoveltySketch
+import configs as c
+
+
+# lists are sampled uniformly, (low, high) tuples are sampled log uniformly
+search_space = {
+    "dqn": {
+        "learning_rate": (1e-5, 1e-3),
+        "gamma": [0.95, 0.99, 0.995],
+        "batch_size": [64, 128, 256],
+        # 10000 pixel transitions take about 1.4 GB, see buffer_memory()
+        "buffer_size": [10000, 20000],
+        "exploration_fraction": [0.05, 0.1, 0.3],
+        "target_update_interval": [1000, 5000, 10000],
+        "train_freq": [4, 8, 16]
+    },
+    "reward_weights": {
+        "health_pickup": (1, 50),
+        "missile_pickup": (1, 50),
+        "metroids_remaining": (50, 500),
+        "enemies_killed": (1, 50),
+        "checkpoint_passed": (1, 100)
+    }
+}
+
+
+def sample_params(space, rng):
+    """
+    Samples a value for every entry of the search space
+
+    :param space (dict): search space, can be nested
+    :param rng (random.Random): random number generator
+
+    :return: (dict)
+    """
+    params = {}
+    for name, values in space.items():
+        if isinstance(values, dict):
+            params[name] = sample_params(values, rng)
+        elif isinstance(values, tuple):
+            low, high = values
+            params[name] = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            params[name] = rng.choice(values)
+
+    return params
+
+
+def buffer_memory(params, config):
+    """
+    Gets the memory the replay buffer of a trial takes once it is full,
+    observations and next observations are both stored
+
+    :param params (dict): sampled 'dqn' and 'reward_weights' values
+    :param config (dict): configuration settings for the environments
+
+    :return: (int) bytes
+    """
+    observation_space, _ = get_spaces(config)
+    if hasattr(observation_space, "spaces"):
+        subspaces = observation_space.spaces.values()
+    else:
+        subspaces = [observation_space]
+    obs_bytes = sum(int(np.prod(s.shape)) * np.dtype(s.dtype).itemsize for s in subspaces)
+
+    return 2 * params["dqn"]["buffer_size"] * obs_bytes
+
+
+def get_eval_config(config):
+    """
+    Gets the config every trial is scored with: the first start state, the
+    default reward weights and no curriculum or novelty bonus, so the scores
+    of trials with different sampled weights can be compared
+
+    :param config (dict): configuration settings of the sweep
+
+    :return: (dict)
+    """
+    return dict(config,
+                states=config["states"][:1],
+                n_envs=1,
+                curriculum=False,
+                novelty=False,
+                reward_weights=None,
+                save_rewards=False,
+                record_path=None)
+
+
+def run_trial(trial_id, params, config, timesteps, n_envs, eval_episodes, results):
+    """
+    Trains a trial up to the given number of timesteps, continuing from its
+    last save with its replay buffer, then evaluates it. Ran in its own process.
+
+    :param trial_id (str): id of the trial, also used for its session
+    :param params (dict): sampled 'dqn' and 'reward_weights' values
+    :param config (dict): configuration settings for the environments
+    :param timesteps (int): total timesteps the trial should be trained for
+    :param n_envs (int): number of environments of the trial
+    :param eval_episodes (int): number of episodes to evaluate over
+    :param results (mp.Queue): queue to put (trial_id, mean evaluation return) in
+    """
+    # keep the learner on a single thread so concurrent trials stay inside the core budget
+    torch.set_num_threads(1)
+
+    session_path = Path(f'sessions/session_{trial_id}')
+    model_path = session_path / 'model'
+    buffer_path = session_path / 'replay_buffer'
+    tb_path = session_path / 'tb'
+
+    cfg = dict(config, n_envs=n_envs, reward_weights=params["reward_weights"])
+    if cfg["save_rewards"]:
+        cfg["save_path"] = str(session_path)
+
+    curriculum = Curriculum(cfg["states"], n_envs) if cfg["curriculum"] else None
+    novelty = RamNoveltySketch() if cfg["novelty"] else None
+
+    env = SubprocVecEnv([make_env(i, cfg, curriculum=curriculum, novelty=novelty) for i in range(n_envs)])
+    # evaluated on its own env, the training env's rewards depend on the sampled weights
+    eval_env = vec_transpose.VecTransposeImage(DummyVecEnv([make_env(0, get_eval_config(config))]))
+
+    if model_path.with_suffix('.zip').exists():
+        model = DQN.load(model_path, env=env, tensorboard_log=tb_path)
+        # promoted trials keep the transitions they collected, so they don't restart from an empty buffer
+        model.load_replay_buffer(buffer_path.with_suffix('.pkl'))
+    else:
+        model = DQN(get_policy(cfg["observation"]),
+                    env,
+                    policy_kwargs=get_policy_kwargs(cfg["features_extractor"], cfg["observation"]),
+                    tensorboard_log=tb_path,
+                    **params["dqn"])
+
+    model.learn(total_timesteps=timesteps - model.num_timesteps, reset_num_timesteps=False)
+    model.save(model_path)
+    model.save_replay_buffer(buffer_path)
+
+    mean_return, _ = evaluate_policy(model, eval_env, n_eval_episodes=eval_episodes)
+
+    env.close()
+    eval_env.close()
+    if curriculum is not None:
+        curriculum.close()
+    if novelty is not None:
+        novelty.close()
+
+    results.put((trial_id, float(mean_return)))
+
+
+def run_rung(trials, timesteps, config, core_budget, memory_budget, envs_per_trial, eval_episodes):
+    """
+    Runs trials concurrently, never using more than core_budget cores, or
+    more than memory_budget bytes of replay buffers, at once
+
+    :param trials (dict): trial id: params
+    :param timesteps (int): total timesteps every trial should be trained for
+    :param config (dict): configuration settings for the environments
+    :param core_budget (int): number of cores the sweep may use
+    :param memory_budget (int): bytes the replay buffers of running trials may use
+    :param envs_per_trial (int): number of environments of each trial
+    :param eval_episodes (int): number of episodes to evaluate over
+
+    :return: (dict) trial id: mean evaluation return
+    """
+    max_parallel = max(1, core_budget // envs_per_trial)
+    memory = {trial_id: buffer_memory(params, config) for trial_id, params in trials.items()}
+
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+
+    pending = list(trials)
+    running = {}
+    scores = {}
+
+    while pending or running:
+        while pending and len(running) < max_parallel:
+            # a trial that doesn't fit waits for running ones to finish, unless nothing is running
+            used = sum(memory[t] for t in running)
+            if running and used + memory[pending[0]] > memory_budget:
+                break
+            trial_id = pending.pop(0)
+            p = ctx.Process(target=run_trial,
+                            args=(trial_id, trials[trial_id], config, timesteps, envs_per_trial, eval_episodes, results))
+            p.start()
+            running[trial_id] = p
+
+        try:
+            trial_id, score = results.get(timeout=10)
+            running.pop(trial_id).join()
+            scores[trial_id] = score
+            print(f"Trial {trial_id}: mean evaluation return {score:.2f} after {timesteps} steps")
+        except queue.Empty:
+            # trials that crashed never report back
+            for trial_id, p in list(running.items()):
+                if p.exitcode is not None and p.exitcode != 0:
+                    running.pop(trial_id)
+                    scores[trial_id] = -math.inf
+                    print(f"Trial {trial_id} crashed with exit code {p.exitcode}")
+
+    return scores
+
+
+def successive_halving(trials, min_timesteps, eta, config, core_budget, memory_budget, envs_per_trial, eval_episodes):
+    """
+    Trains every trial for min_timesteps, keeps the best 1/eta of them, trains
+    those eta times longer, and repeats until one trial is left
+
+    :param trials (dict): trial id: params
+    :param min_timesteps (int): timesteps of the first rung
+    :param eta (int): factor trials are cut by, and timesteps grow by, each rung
+    :param config (dict): configuration settings for the environments
+    :param core_budget (int): number of cores the sweep may use
+    :param memory_budget (int): bytes the replay buffers of running trials may use
+    :param envs_per_trial (int): number of environments of each trial
+    :param eval_episodes (int): number of episodes to evaluate over
+
+    :return: (list[dict]) results of every rung
+    """
+    alive = list(trials)
+    timesteps = min_timesteps
+    rungs = []
+
+    while True:
+        scores = run_rung({t: trials[t] for t in alive}, timesteps, config, core_budget, memory_budget,
+                          envs_per_trial, eval_episodes)
+        rungs.append({"timesteps": timesteps, "scores": scores})
+
+        if len(alive) <= 1:
+            break
+
+        keep = max(1, len(alive) // eta)
+        ranked = sorted(alive, key=lambda t: scores[t], reverse=True)
+        alive = ranked[:keep]
+
+        # pruned trials won't train again, their replay buffers only take up disk space
+        for trial_id in ranked[keep:]:
+            Path(f'sessions/session_{trial_id}/replay_buffer.pkl').unlink(missing_ok=True)
+        timesteps *= eta
+
+    return rungs
+
+
+if __name__ == '__main__':
+
+    cfg = c.short
+
+    n_trials = 27
+    eta = 3
+    envs_per_trial = 2
+    core_budget = os.cpu_count()
+    # memory the replay buffers of concurrent trials may take, set to what your machine can spare
+    memory_budget = 16 * 2**30
+    # first rung trains every trial for 4 episodes per env
+    min_timesteps = cfg["max_steps"] * envs_per_trial * 4
+    # evaluation always starts from the same state, so episodes only differ if the emulator does
+    eval_episodes = 1
+
+    sweep_id = str(uuid4())[:5]
+    rng = random.Random(sweep_id)
+
+    trials = {str(uuid4())[:5]: sample_params(search_space, rng) for _ in range(n_trials)}
+
+    rungs = successive_halving(trials, min_timesteps, eta, cfg, core_budget, memory_budget, envs_per_trial, eval_episodes)
+
+    final_scores = rungs[-1]["scores"]
+    best = max(final_scores, key=final_scores.get)
+    print(f"Best trial: {best}, mean evaluation return {final_scores[best]:.2f}")
+    print(json.dumps(trials[best], indent=4))
+
+    # save the sweep so results can be compared later
+    Path('sessions').mkdir(exist_ok=True)
+    with open(f'sessions/sweep_{sweep_id}.json', 'w') as f:
+        json.dump({"trials": trials, "rungs": rungs, "best": best}, f, indent=4)
@@ -6,21 +6,29 @@ from stable_baselines3.common.vec_env import SubprocVecEnv, vec_transpose
 from stable_baselines3.common.utils import set_random_seed
 from stable_baselines3.common.callbacks import CheckpointCallback, EvalCallback, CallbackList
 
-from metroid_env import MetroidGymEnv
+from metroid_env import MetroidGymEnv, get_spaces
+from feature_extractors import get_policy, get_policy_kwargs
+from remote_vec_env import RemoteVecEnv
+from rollout_worker import start_local_workers
+from curriculum import Curriculum, CurriculumCallback
+from resume import ResumeCallback, attach_memmap_buffer, load_training_state
+from novelty import RamNoveltySketch
 import configs as c
 
 
-def make_env(rank, config, seed=0):
+def make_env(rank, config, seed=0, curriculum=None, novelty=None):
     """
     Utility function for multiprocessed env.
     :param env_id: (str) the environment ID
     :param num_env: (int) the number of environments you wish to have in subprocesses
     :param seed: (int) the initial seed for RNG
     :param rank: (int) index of the subprocess
+    :param curriculum: (Curriculum) start state curriculum shared by all subprocesses
+    :param novelty: (RamNoveltySketch) memory state counts shared by all subprocesses
     """
 
     def _init():
-        env = MetroidGymEnv(config)
+        env = MetroidGymEnv(config, None if curriculum is None else curriculum.worker(rank), novelty)
         env.reset(seed=(seed + rank))
         return env
     
@@ -34,23 +42,66 @@ if __name__ == '__main__':
     n_steps = cfg["max_steps"]
     n_envs = cfg["n_envs"]
 
-    session_id = str(uuid4())[:5]
+    # continue an interrupted session from its last save, i.e. 'sessions/session_cd1f9'
+    resume_session = None
+
+    if resume_session is not None:
+        session_id = Path(resume_session).name.split('_')[1]
+    else:
+        session_id = str(uuid4())[:5]
     session_path = Path(f'sessions/session_{session_id}')
     tb_path = Path(f'sessions/session_{session_id}/tb')
     best_model_path = Path(f'sessions/session_{session_id}/best_model')
+    resume_path = Path(f'sessions/session_{session_id}/resume')
+
+    total_timesteps = n_steps*n_envs*1
 
     if cfg["save_rewards"]:
         cfg["save_path"] = f'sessions/session_{session_id}'
 
+    # run envs in rollout workers that connect over TCP instead of subprocesses
+    # workers on other machines are started with: python rollout_worker.py <learner host>
+    use_remote_envs = False
+    # only accepts workers on this machine, use '0.0.0.0' for workers on other machines
+    remote_host = '127.0.0.1'
+    remote_port = 5555
+    # number of the remote workers to start on this machine
+    n_local_workers = n_envs
+
+    # stats are shared through memory, so only envs on this machine can use the curriculum and novelty counts
+    curriculum = None
+    if cfg["curriculum"] and not use_remote_envs:
+        curriculum = Curriculum(cfg["states"], n_envs)
+
+    novelty = None
+    if cfg["novelty"] and not use_remote_envs:
+        novelty = RamNoveltySketch()
+
     # create environment
-    env = SubprocVecEnv([make_env(i, cfg) for i in range(n_envs)])
+    if use_remote_envs:
+        workers = start_local_workers(n_local_workers, remote_port)
+        observation_space, action_space = get_spaces(cfg)
+        env = RemoteVecEnv(cfg, n_envs, observation_space, action_space, host=remote_host, port=remote_port)
+    else:
+        env = SubprocVecEnv([make_env(i, cfg, curriculum=curriculum, novelty=novelty) for i in range(n_envs)])
     eval_env = vec_transpose.VecTransposeImage(env)
 
     # establish callbacks
     enable_callbacks = True
     callbacks = []
 
+    # timesteps over all envs between saves of the training state, when the config is resumable
+    resume_interval = 20000
+
     if enable_callbacks:
+        # runs first, the evaluation callback steps the training envs
+        if cfg["resumable"]:
+            resume_callback = ResumeCallback(save_interval=resume_interval,
+                                             path=resume_path,
+                                             curriculum=curriculum,
+                                             novelty=novelty)
+            callbacks.append(resume_callback)
+
         checkpoint_callback = CheckpointCallback(save_freq=n_steps, 
                                                  save_path=session_path, 
                                                  name_prefix='mai')
@@ -63,13 +114,17 @@ if __name__ == '__main__':
         callbacks.append(checkpoint_callback)
         callbacks.append(evaluation_callback)
 
+        if curriculum is not None:
+            callbacks.append(CurriculumCallback(curriculum))
+
     callbacks = CallbackList(callbacks)
 
-    model = DQN('CnnPolicy', 
+    model = DQN(get_policy(cfg["observation"]), 
                 env, 
                 verbose=1, 
                 buffer_size=10000,
                 batch_size=256, 
+                policy_kwargs=get_policy_kwargs(cfg["features_extractor"], cfg["observation"]),
                 tensorboard_log=tb_path)
     
     # load pretrained model
@@ -82,9 +137,25 @@ if __name__ == '__main__':
         model.n_envs = n_envs
         model.tensorboard_log=tb_path
 
+    # restores the replay buffer, optimizer, timesteps and env states of the session
+    if resume_session is not None:
+        model, total_timesteps = load_training_state(resume_path, env, curriculum, novelty, verbose=1, tensorboard_log=tb_path)
+    elif cfg["resumable"]:
+        # replay buffer is kept in files so it can be resumed
+        attach_memmap_buffer(model.replay_buffer, resume_path / 'replay_buffer', 'w+')
 
-    model.learn(total_timesteps=n_steps*n_envs*1, callback=callbacks)
+
+    model.learn(total_timesteps=total_timesteps - model.num_timesteps, 
+                callback=callbacks, 
+                reset_num_timesteps=resume_session is None)
 
     # close environments
     env.close()
     eval_env.close()
+    if use_remote_envs:
+        workers.stop()
+
+    if curriculum is not None:
+        curriculum.close()
+    if novelty is not None:
+        novelty.close()
@@ -0,0 +1,229 @@
+import os
+import json
+from pathlib import Path
+
+import numpy as np
+
+from gymnasium import spaces
+
+
+def get_fields(observation_space):
+    """
+    Gets the (shape, dtype) of every array stored for a transition.
+    Dict observations get an array per key.
+
+    :param observation_space (spaces.Space): Box or Dict of Boxes
+
+    :return: (dict), (list[str])
+    """
+    fields = {}
+    obs_keys = None
+
+    if isinstance(observation_space, spaces.Dict):
+        obs_keys = list(observation_space.spaces.keys())
+        for k in obs_keys:
+            fields[f"observations_{k}"] = (observation_space[k].shape, np.dtype(observation_space[k].dtype))
+    else:
+        fields["observations"] = (observation_space.shape, np.dtype(observation_space.dtype))
+
+    fields["actions"] = ((), np.dtype(np.int16))
+    fields["rewards"] = ((), np.dtype(np.float32))
+    fields["dones"] = ((), np.dtype(bool))
+
+    return fields, obs_keys
+
+
+class TransitionRecorder:
+    """
+    Streams (obs, action, reward, done) transitions into shards of memory
+    mapped files. index.json lists the shards and how many rows of each
+    are written, and is updated at the end of every episode and shard.
+    """
+    def __init__(self, path, observation_space, shard_size=4096):
+        """
+        Constructor for TransitionRecorder
+
+        :param path (str): directory to write the shards and index to
+        :param observation_space (spaces.Space): observation space of the env
+        :param shard_size (int): number of transitions in each shard
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.shard_size = shard_size
+        self.fields, self.obs_keys = get_fields(observation_space)
+
+        self.index = {
+            "shard_size": shard_size,
+            "obs_keys": self.obs_keys,
+            "fields": {name: {"shape": list(shape), "dtype": dtype.str} for name, (shape, dtype) in self.fields.items()},
+            "shards": []
+        }
+
+        # initialized in self.open_shard()
+        self.arrays = None
+        self.count = 0
+
+
+    def open_shard(self):
+        """
+        Creates the files of the next shard
+        """
+        name = f"shard_{len(self.index['shards']):05d}"
+        shard_path = self.path / name
+        shard_path.mkdir(exist_ok=True)
+
+        self.arrays = {}
+        for field, (shape, dtype) in self.fields.items():
+            self.arrays[field] = np.memmap(shard_path / f"{field}.dat",
+                                           dtype=dtype,
+                                           mode="w+",
+                                           shape=(self.shard_size, *shape))
+
+        self.index["shards"].append({"path": name, "count": 0})
+        self.count = 0
+
+
+    def record(self, obs, action, reward, done):
+        """
+        Writes a transition to the current shard
+
+        :param obs (np.ndarray | dict): observation the action was chosen from
+        :param action (int): action taken
+        :param reward (float): reward for taking the action
+        :param done (bool): if the episode ended after the action
+        """
+        if self.arrays is None or self.count == self.shard_size:
+            self.flush()
+            self.open_shard()
+
+        if self.obs_keys is None:
+            self.arrays["observations"][self.count] = obs
+        else:
+            for k in self.obs_keys:
+                self.arrays[f"observations_{k}"][self.count] = obs[k]
+
+        self.arrays["actions"][self.count] = action
+        self.arrays["rewards"][self.count] = reward
+        self.arrays["dones"][self.count] = done
+        self.count += 1
+
+        if done:
+            self.flush()
+
+
+    def flush(self):
+        """
+        Writes the shard to disk, then updates the index so readers can see it
+        """
+        if self.arrays is None:
+            return
+
+        for array in self.arrays.values():
+            array.flush()
+        self.index["shards"][-1]["count"] = self.count
+
+        # write to a temporary file first so readers never see a partial index
+        tmp_path = self.path / "index.json.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=4)
+        os.replace(tmp_path, self.path / "index.json")
+
+
+    def close(self):
+        """
+        Flushes the last shard and closes its files
+        """
+        self.flush()
+        self.arrays = None
+
+
+class TransitionDataset:
+    """
+    Reads transitions written by TransitionRecorder. Shards are memory
+    mapped, so only the rows of each sampled minibatch are read from disk.
+    """
+    def __init__(self, root):
+        """
+        Constructor for TransitionDataset
+
+        :param root (str): directory searched for index.json files
+        """
+        self.shards = []
+        self.counts = []
+        self.fields = None
+        self.obs_keys = None
+
+        for index_path in sorted(Path(root).glob("**/index.json")):
+            with open(index_path) as f:
+                index = json.load(f)
+
+            fields = {name: (tuple(v["shape"]), np.dtype(v["dtype"])) for name, v in index["fields"].items()}
+            if self.fields is None:
+                self.fields = fields
+                self.obs_keys = index["obs_keys"]
+            elif fields != self.fields:
+                raise Exception(f"{index_path} was recorded with a different observation space")
+
+            for shard in index["shards"]:
+                if shard["count"] == 0:
+                    continue
+
+                shard_path = index_path.parent / shard["path"]
+                arrays = {}
+                for field, (shape, dtype) in fields.items():
+                    arrays[field] = np.memmap(shard_path / f"{field}.dat",
+                                              dtype=dtype,
+                                              mode="r",
+                                              shape=(index["shard_size"], *shape))
+
+                self.shards.append(arrays)
+                self.counts.append(shard["count"])
+
+        if not self.shards:
+            raise Exception(f"No recorded transitions found in {root}")
+
+        self.counts = np.array(self.counts)
+        self.rng = np.random.default_rng()
+
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+
+    def sample(self, batch_size):
+        """
+        Samples a minibatch of transitions uniformly from all shards
+
+        :param batch_size (int): number of transitions
+
+        :return: (dict) 'observations', 'actions', 'rewards' and 'dones'
+        """
+        shard_ids = self.rng.choice(len(self.shards), size=batch_size, p=self.counts / self.counts.sum())
+
+        batch = {name: np.empty((batch_size, *shape), dtype=dtype) for name, (shape, dtype) in self.fields.items()}
+
+        for s in np.unique(shard_ids):
+            rows = np.flatnonzero(shard_ids == s)
+            # sorted indices read the file front to back
+            indices = np.sort(self.rng.integers(0, self.counts[s], size=len(rows)))
+            for name, array in self.shards[s].items():
+                batch[name][rows] = array[indices]
+
+        if self.obs_keys is not None:
+            batch["observations"] = {k: batch.pop(f"observations_{k}") for k in self.obs_keys}
+
+        return batch
+
+
+    def iter_batches(self, batch_size, n_batches):
+        """
+        Yields sampled minibatches
+
+        :param batch_size (int): number of transitions in each minibatch
+        :param n_batches (int): number of minibatches
+
+        :return: (Iterator[dict])
+        """
+        for _ in range(n_batches):
+            yield self.sample(batch_size)
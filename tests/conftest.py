@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# modules in src/ import each other by name, the same way they do when run from src/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from curriculum import Curriculum
+
+
+def test_mastered_state_is_rarely_picked():
+    np.random.seed(0)
+    rng = np.random.default_rng(0)
+
+    n_workers, n_episodes = 4, 400
+    curriculum = Curriculum(["solved", "learning", "unsolved"], n_workers, explore=0.1)
+    workers = [curriculum.worker(rank) for rank in range(n_workers)]
+
+    try:
+        for episode in range(n_episodes):
+            worker = workers[episode % n_workers]
+            state = worker.sample()
+            if state == 0:
+                success = True
+            elif state == 1:
+                # success rate climbs as the state is played
+                attempts = curriculum.stats.array[:, 1, 0].sum()
+                success = rng.random() < min(attempts / 100, 1)
+            else:
+                success = False
+            worker.record(state, success, not success, float(success))
+
+        summary = curriculum.summary()
+        n_states = len(curriculum.states)
+
+        assert summary["learning_progress"][0] == pytest.approx(0, abs=1e-9)
+        assert summary["probability"][0] == pytest.approx(curriculum.explore / n_states, abs=1e-6)
+        assert summary["probability"][1] > 0.5
+        assert summary["attempts"][0] < 0.1 * n_episodes
+    finally:
+        curriculum.close()
@@ -0,0 +1,62 @@
+import pickle
+
+import memory_constants as mem
+from novelty import RamNoveltySketch
+
+
+def read_from(memory):
+    return lambda address: memory.get(address, 0)
+
+
+def test_counts_are_shared_with_pickled_copies():
+    sketch = RamNoveltySketch(width=1024)
+    try:
+        # envs get the sketch pickled into their subprocess
+        copy = pickle.loads(pickle.dumps(sketch))
+
+        assert copy.visit(b"state") == 1
+        assert sketch.visit(b"state") == 2
+        assert copy.visit(b"state") == 3
+        assert sketch.visit(b"other") == 1
+    finally:
+        sketch.close()
+
+
+def test_visit_returns_the_smallest_row_count():
+    sketch = RamNoveltySketch(depth=4, width=1024)
+    try:
+        columns = sketch.columns(b"state")
+        assert len(set(c % sketch.width for c in columns)) == sketch.depth
+
+        # other keys colliding in every row but one inflate those counters
+        counts = sketch.counts.array.reshape(-1)
+        for i, column in enumerate(columns[:-1]):
+            counts[column] = 10 + i
+
+        assert sketch.visit(b"state") == 1
+        assert sketch.visit(b"state") == 2
+        assert [int(counts[c]) for c in columns] == [12, 13, 14, 2]
+    finally:
+        sketch.close()
+
+
+def test_state_key_covers_enemies_and_items():
+    sketch = RamNoveltySketch(width=1024)
+    try:
+        memory = {mem.PREV_SAMUS_X_PIXEL: 64, mem.ENEMY_SPAWN_FLAGS + 0x1A: 0x01}
+        key = sketch.state_key(read_from(memory))
+
+        # a few pixels of movement is the same state
+        memory[mem.PREV_SAMUS_X_PIXEL] = 70
+        assert sketch.state_key(read_from(memory)) == key
+
+        # killing an enemy, or collecting an item, is a new one
+        memory[mem.ENEMY_SPAWN_FLAGS + 0x1A] = 0x02
+        assert sketch.state_key(read_from(memory)) != key
+
+        # enemy positions change every frame and aren't part of it
+        key = sketch.state_key(read_from(memory))
+        memory[mem.ENEMY_SLOTS + 0x01] = 0x88
+        assert sketch.state_key(read_from(memory)) == key
+    finally:
+        sketch.close()
@@ -0,0 +1,205 @@
+import pickle
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from gymnasium import Env, spaces
+
+from remote_vec_env import (HELLO, CONFIG, READY, RESET, OBS, CALL, RESULT, OBS_SIZE,
+                            RemoteVecEnv, ObsCodec, safe_loads, send_message, recv_message)
+from rollout_worker import start_local_workers
+
+
+EPISODE_LENGTH = 3
+# action that makes the env raise
+CRASH_ACTION = 3
+
+
+class StubEnv(Env):
+    """
+    Env whose observation is [steps taken, last action], ends after EPISODE_LENGTH steps
+    """
+    observation_space = spaces.Box(low=0, high=255, shape=(2,), dtype=np.uint8)
+    action_space = spaces.Discrete(4)
+    render_mode = None
+
+    def __init__(self, config):
+        self.steps_taken = 0
+        self.last_obs = None
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        self.steps_taken = 0
+        self.last_obs = np.array([0, 0], dtype=np.uint8)
+        return self.last_obs, {}
+
+    def step(self, action):
+        if action == CRASH_ACTION:
+            raise RuntimeError("emulator crashed")
+        self.steps_taken += 1
+        self.last_obs = np.array([self.steps_taken, action], dtype=np.uint8)
+        return self.last_obs, 1.0, False, self.steps_taken >= EPISODE_LENGTH, {}
+
+    def get_snapshot(self):
+        return {'emulator': b'state', 'attributes': {'steps_taken': self.steps_taken, 'last_obs': self.last_obs}}
+
+    def load_snapshot(self, snapshot):
+        for name, value in snapshot['attributes'].items():
+            setattr(self, name, value)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def remote_env():
+    port = free_port()
+    workers = start_local_workers(2, port, env_factory=StubEnv)
+    env = RemoteVecEnv({}, 2, StubEnv.observation_space, StubEnv.action_space, port=port, timeout=10)
+
+    yield env, workers, port
+
+    env.close()
+    workers.stop()
+
+
+def test_step_and_auto_reset(remote_env):
+    env, _, _ = remote_env
+
+    obs = env.reset()
+    assert obs.shape == (2, 2)
+    assert (obs == 0).all()
+
+    for step in range(1, EPISODE_LENGTH):
+        obs, rewards, dones, infos = env.step(np.array([1, 2]))
+        assert obs.tolist() == [[step, 1], [step, 2]]
+        assert rewards.tolist() == [1.0, 1.0]
+        assert not dones.any()
+
+    obs, rewards, dones, infos = env.step(np.array([2, 0]))
+    assert dones.all()
+    # returned observation is the first of the next episode
+    assert (obs == 0).all()
+    assert infos[0]["terminal_observation"].tolist() == [EPISODE_LENGTH, 2]
+    assert infos[0]["TimeLimit.truncated"]
+
+
+def test_get_attr_and_env_method(remote_env):
+    env, _, _ = remote_env
+
+    env.reset()
+    env.step(np.array([1, 1]))
+    assert env.get_attr("steps_taken") == [1, 1]
+    assert env.get_attr("steps_taken", indices=[1]) == [1]
+
+    snapshots = env.env_method("get_snapshot")
+    assert snapshots[0]['attributes']['last_obs'].tolist() == [1, 1]
+
+    env.step(np.array([2, 2]))
+    env.env_method("load_snapshot", snapshots[0], indices=[0])
+    assert env.get_attr("steps_taken") == [1, 2]
+
+    # only whitelisted calls reach the workers
+    with pytest.raises(AttributeError):
+        env.get_attr("__class__")
+    with pytest.raises(AttributeError):
+        env.env_method("close")
+    with pytest.raises(AttributeError):
+        env.set_attr("steps_taken", 0)
+    with pytest.raises(Exception, match="not allowed"):
+        env.call(0, "env_method", ("close", (), {}))
+
+
+def test_dead_worker_is_replaced(remote_env):
+    env, workers, port = remote_env
+
+    env.reset()
+    env.step(np.array([1, 1]))
+
+    # killed workers are restarted by the supervisor
+    for p in workers.processes:
+        p.terminate()
+        p.join()
+
+    obs, rewards, dones, infos = env.step(np.array([1, 1]))
+    assert dones.all()
+    assert infos[0]["TimeLimit.truncated"]
+    assert infos[0]["terminal_observation"].tolist() == [1, 1]
+    assert (obs == 0).all()
+
+    # replacements keep stepping normally
+    obs, rewards, dones, infos = env.step(np.array([2, 1]))
+    assert obs.tolist() == [[1, 2], [1, 1]]
+    assert not dones.any()
+
+
+def test_env_crash_reconnects_with_new_env(remote_env):
+    env, workers, _ = remote_env
+
+    env.reset()
+    env.step(np.array([1, 1]))
+
+    obs, rewards, dones, infos = env.step(np.array([CRASH_ACTION, 1]))
+    assert dones.tolist() == [True, False]
+    assert infos[0]["TimeLimit.truncated"]
+    assert obs.tolist() == [[0, 0], [2, 1]]
+
+    # the worker process survived and serves a new env
+    assert all(p.is_alive() for p in workers.processes)
+    obs, rewards, dones, infos = env.step(np.array([2, 2]))
+    assert obs[0].tolist() == [1, 2]
+    assert not dones[0]
+
+
+def test_accept_times_out_without_workers():
+    with pytest.raises(Exception, match="No rollout worker connected"):
+        RemoteVecEnv({}, 1, StubEnv.observation_space, StubEnv.action_space, port=free_port(), accept_timeout=0.5)
+
+
+def test_garbage_result_drops_worker():
+    port = free_port()
+    codec = ObsCodec(StubEnv.observation_space)
+
+    def fake_worker():
+        sock = socket.create_connection(("127.0.0.1", port))
+        send_message(sock, HELLO)
+        recv_message(sock, CONFIG)
+        send_message(sock, READY, OBS_SIZE.pack(codec.size))
+        # render_mode asked for by VecEnv, then a result cut short
+        recv_message(sock, CALL)
+        send_message(sock, RESULT, pickle.dumps((True, None)))
+        recv_message(sock, CALL)
+        send_message(sock, RESULT, pickle.dumps((True, np.zeros(8)))[:-10])
+        try:
+            recv_message(sock)
+        except OSError:
+            pass
+        sock.close()
+
+    thread = threading.Thread(target=fake_worker)
+    thread.start()
+    env = RemoteVecEnv({}, 1, StubEnv.observation_space, StubEnv.action_space, port=port, timeout=5)
+
+    assert env.get_attr("steps_taken") == [None]
+    assert env.sockets[0] is None
+
+    env.close()
+    thread.join(timeout=5)
+
+
+def test_worker_results_cant_run_code():
+    payload = pickle.dumps((True, np.zeros(3, dtype=np.float32)))
+    ok, value = safe_loads(payload)
+    assert ok and value.tolist() == [0, 0, 0]
+
+    class Exploit:
+        def __reduce__(self):
+            return (print, ("ran",))
+
+    with pytest.raises(pickle.UnpicklingError):
+        safe_loads(pickle.dumps(Exploit()))
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+
+from gymnasium import spaces
+
+from transition_dataset import TransitionRecorder, TransitionDataset
+
+
+BOX_SPACE = spaces.Box(low=0, high=255, shape=(2, 3), dtype=np.uint8)
+DICT_SPACE = spaces.Dict({
+    'screen': spaces.Box(low=0, high=255, shape=(2, 3), dtype=np.uint8),
+    'ram': spaces.Box(low=0, high=1, shape=(4,), dtype=np.float32)
+})
+
+
+def read_index(path):
+    with open(path / "index.json") as f:
+        return json.load(f)
+
+
+def box_obs(i):
+    return np.full((2, 3), i, dtype=np.uint8)
+
+
+def test_shards_roll_over_at_shard_size(tmp_path):
+    recorder = TransitionRecorder(tmp_path, BOX_SPACE, shard_size=4)
+    for i in range(10):
+        recorder.record(box_obs(i), i % 3, float(i), False)
+    recorder.close()
+
+    shards = read_index(tmp_path)["shards"]
+    assert [s["count"] for s in shards] == [4, 4, 2]
+    assert [s["path"] for s in shards] == ["shard_00000", "shard_00001", "shard_00002"]
+
+
+def test_index_only_advances_on_done_or_rollover(tmp_path):
+    recorder = TransitionRecorder(tmp_path, BOX_SPACE, shard_size=4)
+
+    recorder.record(box_obs(0), 0, 0.0, False)
+    recorder.record(box_obs(1), 0, 0.0, False)
+    assert not (tmp_path / "index.json").exists()
+
+    recorder.record(box_obs(2), 0, 0.0, True)
+    assert [s["count"] for s in read_index(tmp_path)["shards"]] == [3]
+
+    recorder.record(box_obs(3), 0, 0.0, False)
+    assert [s["count"] for s in read_index(tmp_path)["shards"]] == [3]
+
+    # the full shard is written when the next one is opened
+    recorder.record(box_obs(4), 0, 0.0, False)
+    assert [s["count"] for s in read_index(tmp_path)["shards"]] == [4]
+
+    recorder.record(box_obs(5), 0, 0.0, True)
+    assert [s["count"] for s in read_index(tmp_path)["shards"]] == [4, 2]
+
+
+def test_dict_observations_round_trip(tmp_path):
+    recorder = TransitionRecorder(tmp_path, DICT_SPACE, shard_size=8)
+    for i in range(5):
+        obs = {'screen': box_obs(i), 'ram': np.full(4, i / 10, dtype=np.float32)}
+        recorder.record(obs, i, float(i), i == 4)
+    recorder.close()
+
+    dataset = TransitionDataset(tmp_path)
+    assert len(dataset) == 5
+
+    batch = dataset.sample(64)
+    assert set(batch["observations"]) == {'screen', 'ram'}
+    assert batch["observations"]['screen'].shape == (64, 2, 3)
+    assert batch["observations"]['ram'].dtype == np.float32
+
+    # every sampled row is a transition that was recorded, with its fields matching
+    i = batch["actions"]
+    assert (batch["observations"]['screen'] == i[:, None, None]).all()
+    assert np.allclose(batch["observations"]['ram'], i[:, None] / 10)
+    assert np.allclose(batch["rewards"], i)
+    assert (batch["dones"] == (i == 4)).all()
+
+
+def test_sample_stays_below_recorded_counts(tmp_path):
+    recorder = TransitionRecorder(tmp_path, BOX_SPACE, shard_size=8)
+    # rows written after the last done aren't in the index, and unwritten rows are 0
+    for i in range(1, 12):
+        recorder.record(box_obs(i), 0, float(i), i in (8, 10))
+    recorder.record(box_obs(99), 0, 99.0, False)
+
+    dataset = TransitionDataset(tmp_path)
+    assert dataset.counts.tolist() == [8, 2]
+
+    rewards = np.concatenate([dataset.sample(256)["rewards"] for _ in range(10)])
+    assert set(rewards.tolist()) == set(float(i) for i in range(1, 11))